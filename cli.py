@@ -357,7 +357,9 @@ def index(
             console.print(f"  Chunks: {status['total_chunks']}")
             return
         
-        embedding_service = EmbeddingService()
+        embedding_service = EmbeddingService(
+            cache_path=str(hive_dir / "embedding_cache.db")
+        )
         vectordb = VectorDB(persist_dir=str(hive_dir / "vectordb"))
         indexer = CodebaseIndexer(
             workspace_path=str(project_path),
@@ -10,6 +10,8 @@ from tools.guardrails import (
     AuditLogger,
     PROTECTED_PATHS,
     PROTECTED_PATTERNS,
+    get_validator,
+    get_audit_logger,
 )
 
 
@@ -60,6 +62,11 @@ class TestPathValidator:
         
         protected, reason = validator.is_protected(".git/config")
         assert protected
+        
+        # Deeply nested
+        protected, reason = validator.is_protected("a/b/c/d/.git/config")
+        assert protected
+        assert "directory: .git" in reason
     
     def test_protected_env_files(self):
         """Test that .env files are protected."""
@@ -172,6 +179,7 @@ class TestAuditLogger:
                 path="test.txt",
                 result="success",
             )
+            logger.close()
             
             assert Path(f"{tmpdir}/audit.log").exists()
     
@@ -191,6 +199,7 @@ class TestAuditLogger:
                 result="blocked",
                 details="Protected path",
             )
+            logger.close()
             
             with open(f"{tmpdir}/audit.log") as f:
                 content = f.read()
@@ -221,10 +230,65 @@ class TestAuditLogger:
                 )
             
             recent = logger.get_recent(3)
+            logger.close()
             assert len(recent) == 3
             assert "file4.txt" in recent[-1]
             assert "file2.txt" in recent[0]
     
+    def test_background_writer_drains_queue(self):
+        """Test that queued entries reach the file without an explicit flush."""
+        import time
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = AuditLogger(
+                workspace_path=tmpdir,
+                log_file=f"{tmpdir}/audit.log"
+            )
+            
+            for i in range(50):
+                logger.log(
+                    agent="agent",
+                    tool="tool",
+                    action="action",
+                    path=f"file{i}.txt",
+                    result="success",
+                )
+            
+            log_path = Path(f"{tmpdir}/audit.log")
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                if log_path.exists() and len(log_path.read_text().splitlines()) == 50:
+                    break
+                time.sleep(0.01)
+            
+            logger.close()
+            
+            lines = log_path.read_text().splitlines()
+            assert len(lines) == 50
+            assert "file0.txt" in lines[0]
+            assert "file49.txt" in lines[-1]
+    
+    def test_close_stops_writer_thread(self):
+        """Test that close() joins the writer thread and writes pending entries."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = AuditLogger(
+                workspace_path=tmpdir,
+                log_file=f"{tmpdir}/audit.log"
+            )
+            
+            logger.log(agent="agent", tool="tool", action="action", path="a.txt", result="success")
+            worker = logger._worker
+            assert worker.is_alive()
+            
+            logger.close()
+            assert not worker.is_alive()
+            assert "a.txt" in Path(f"{tmpdir}/audit.log").read_text()
+            
+            # Logging after close starts a new writer
+            logger.log(agent="agent", tool="tool", action="action", path="b.txt", result="success")
+            logger.close()
+            assert "b.txt" in Path(f"{tmpdir}/audit.log").read_text()
+    
     def test_get_recent_empty_log(self):
         """Test get_recent with no log file."""
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -237,6 +301,23 @@ class TestAuditLogger:
             assert recent == []
 
 
+class TestSingletons:
+    """Tests for per-workspace singleton accessors."""
+    
+    def test_validator_reused_per_workspace(self):
+        """Test that the same validator is returned for the same workspace."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            assert get_validator(tmpdir) is get_validator(tmpdir)
+            assert get_validator(tmpdir) is not get_validator(None)
+    
+    def test_audit_logger_reused_per_workspace(self):
+        """Test that the same audit logger is returned for the same workspace."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = get_audit_logger(tmpdir)
+            assert logger is get_audit_logger(tmpdir)
+            assert logger.log_file == Path(tmpdir) / ".hive" / "audit.log"
+
+
 class TestProtectedPaths:
     """Tests for protected paths configuration."""
     
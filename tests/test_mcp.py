@@ -391,6 +391,14 @@ class TestMCPTool:
         topic_param = next(p for p in tool.parameters if p.name == "topic")
         assert topic_param.required == False
 
+    def test_mcp_tool_parameters_lazy(self, mock_client, tool_schema):
+        """Should convert parameters only on first access and cache them."""
+        tool = MCPTool(mock_client, tool_schema, "context7")
+        
+        assert "parameters" not in tool.__dict__
+        params = tool.parameters
+        assert tool.parameters is params
+
     async def test_mcp_tool_execute_success(self, mock_client, tool_schema):
         """Should execute MCP tool and return result."""
         mock_client.call_tool = AsyncMock(return_value=MCPToolResult(
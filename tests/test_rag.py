@@ -2,15 +2,21 @@
 Tests for RAG components.
 
 Tests chunking, vectordb, and basic functionality.
-Embedding tests are skipped by default (require API key).
+Embedding API tests are skipped by default (require API key).
 """
 
+import asyncio
+import json
 import tempfile
+import time
 from pathlib import Path
+from types import SimpleNamespace
 
+import numpy as np
 import pytest
 
 from tools.rag.chunker import CodeChunker, Chunk
+from tools.rag.rag_tool import RAGSearchTool
 from tools.rag.vectordb import VectorDB, SearchResult
 
 
@@ -72,6 +78,8 @@ class TestCodeChunker:
         assert chunker.detect_language("test.ts") == "typescript"
         assert chunker.detect_language("test.md") == "markdown"
         assert chunker.detect_language("test.unknown") == "text"
+        assert chunker.detect_language("src/App.TSX") == "typescript"
+        assert chunker.detect_language("pkg.v2/Makefile") == "text"
     
     def test_chunk_python_file(self):
         """Test chunking a Python file."""
@@ -112,6 +120,39 @@ class MyClass:
             assert chunk.start_line >= 1
             assert chunk.end_line >= chunk.start_line
     
+    def test_chunk_python_keeps_decorators_with_definition(self):
+        """Test that decorators start the chunk of the definition they decorate."""
+        chunker = CodeChunker(min_chunk_size=0)
+        
+        content = '''import functools
+
+@functools.lru_cache(
+    maxsize=None,
+)
+def cached():
+    return 1
+'''
+        
+        chunks = chunker.chunk_file("test.py", content)
+        
+        func = next(c for c in chunks if c.chunk_type == "function")
+        assert func.start_line == 3
+        assert func.content.startswith("@functools.lru_cache(")
+        assert "def cached" in func.content
+    
+    def test_chunk_python_decorator_run_is_linear(self):
+        """Test that a long run of decorators without a definition scans quickly."""
+        chunker = CodeChunker(min_chunk_size=0)
+        
+        content = "@decorator\n" * 20000 + "x = 1\n\n@decorator\ndef func():\n    pass\n"
+        
+        start = time.perf_counter()
+        chunks = chunker.chunk_file("test.py", content)
+        assert time.perf_counter() - start < 1.0
+        
+        func = next(c for c in chunks if c.chunk_type == "function")
+        assert func.start_line == 20003
+    
     def test_chunk_markdown_file(self):
         """Test chunking a Markdown file."""
         chunker = CodeChunker()
@@ -168,6 +209,48 @@ More content.
             for line in range(chunk.start_line, chunk.end_line + 1):
                 all_lines.add(line)
     
+    def test_chunk_by_lines_overlap(self):
+        """Test that line chunks overlap by at most chunk_overlap characters."""
+        # Every line is 8 characters including its newline
+        content = "\n".join(f"Line {i:02d}" for i in range(40))
+        
+        chunks = CodeChunker(chunk_size=100, chunk_overlap=16, min_chunk_size=0).chunk_file("test.txt", content)
+        assert len(chunks) > 1
+        for prev, chunk in zip(chunks, chunks[1:]):
+            assert chunk.start_line == prev.end_line - 1
+        
+        chunks = CodeChunker(chunk_size=100, chunk_overlap=0, min_chunk_size=0).chunk_file("test.txt", content)
+        for prev, chunk in zip(chunks, chunks[1:]):
+            assert chunk.start_line == prev.end_line + 1
+    
+    def test_chunk_minified_file_as_single_chunk(self):
+        """Test that minified content gets one coarse chunk."""
+        chunker = CodeChunker(chunk_size=100)
+        content = "var a=1;" * 2000 + "\n" + "function f(){return a}" * 100
+        
+        chunks = chunker.chunk_file("bundle.min.js", content)
+        
+        assert len(chunks) == 1
+        assert chunks[0].content == content[:100]
+        assert chunks[0].metadata == {"truncated": True}
+    
+    def test_chunk_files_parallel(self):
+        """Test chunking several files in worker processes."""
+        chunker = CodeChunker()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for i in range(4):
+                path = Path(tmpdir) / f"mod{i}.py"
+                path.write_text(f"def func{i}():\n    return {i}\n")
+                paths.append(str(path))
+            
+            results = chunker.chunk_files(paths, max_workers=2)
+        
+        assert list(results) == paths
+        for i, path in enumerate(paths):
+            assert results[path] == chunker.chunk_file(path, f"def func{i}():\n    return {i}\n")
+    
     def test_merge_small_chunks(self):
         """Test that small chunks are merged."""
         chunker = CodeChunker(min_chunk_size=50)
@@ -197,6 +280,24 @@ z
             # After merging, chunks should be at least min_chunk_size
             # (unless it's the last/only chunk)
             pass  # Just verify no errors
+    
+    def test_merge_small_chunks_by_tokens(self):
+        """Test that a tokenizer switches min_chunk_size to token counts."""
+        class WordTokenizer:
+            def encode_ordinary_batch(self, texts):
+                return [text.split() for text in texts]
+        
+        # Each section is well over 20 characters but only 3 words
+        content = "# A\n\nlongword_" + "a" * 30 + "\n\n# B\n\nlongword_" + "b" * 30 + "\n"
+        
+        by_chars = CodeChunker(min_chunk_size=20).chunk_file("test.md", content)
+        by_tokens = CodeChunker(min_chunk_size=20, tokenizer=WordTokenizer()).chunk_file(
+            "test.md", content
+        )
+        
+        assert len(by_chars) == 2
+        assert len(by_tokens) == 1
+        assert by_tokens[0].start_line == 1
 
 
 class TestVectorDB:
@@ -259,6 +360,182 @@ class TestVectorDB:
         assert len(results) == 2
         assert all(isinstance(r, SearchResult) for r in results)
     
+    def test_search_score_threshold(self, temp_db):
+        """Test that low-scoring hits are dropped before building results."""
+        chunks = [
+            Chunk(
+                content=f"content{i}",
+                file_path="/test/file.py",
+                start_line=i + 1,
+                end_line=i + 1,
+                language="python",
+            )
+            for i in range(2)
+        ]
+        temp_db.add_chunks(chunks, [[1.0, 0.0], [0.0, 1.0]])
+        
+        ids, distances, metadatas, documents = temp_db.search_raw([1.0, 0.0], n_results=2)
+        assert len(ids) == len(metadatas) == len(documents) == 2
+        assert isinstance(distances, np.ndarray)
+        
+        results = temp_db.search([1.0, 0.0], n_results=2, score_threshold=0.5)
+        assert [r.chunk.content for r in results] == ["content0"]
+        assert isinstance(results[0].score, float)
+    
+    def test_add_chunks_stream(self, temp_db):
+        """Test adding many small batches through coalesced upserts."""
+        batches = []
+        for i in range(5):
+            chunks = [
+                Chunk(
+                    content=f"content {i}-{j}",
+                    file_path=f"/test/file{i}.py",
+                    start_line=j + 1,
+                    end_line=j + 1,
+                    language="python",
+                )
+                for j in range(3)
+            ]
+            batches.append((chunks, np.full((3, 8), i + 1, dtype=np.float32)))
+        
+        added = temp_db.add_chunks_stream(batches, batch_size=4)
+        
+        assert added == 15
+        assert temp_db.get_stats()["total_chunks"] == 15
+        assert len(temp_db.get_file_chunks("/test/file2.py")) == 3
+    
+    def test_content_stored_compressed(self, temp_db):
+        """Test that chunk text lives in the content store, not in ChromaDB."""
+        chunks = [
+            Chunk(
+                content=f"def f{i}():\n    return 'ü{i}'\n",
+                file_path=f"/test/file{i % 2}.py",
+                start_line=i + 1,
+                end_line=i + 1,
+                language="python",
+            )
+            for i in range(4)
+        ]
+        temp_db.add_chunks(chunks, [[1.0, float(i)] for i in range(4)])
+        
+        assert temp_db.content_store.path.exists()
+        assert temp_db.collection.get(include=["documents"])["documents"] == [None] * 4
+        
+        file_chunks = temp_db.get_file_chunks("/test/file1.py")
+        assert sorted(c.content for c in file_chunks) == [chunks[1].content, chunks[3].content]
+        results = temp_db.search([1.0, 0.0], n_results=1)
+        assert results[0].chunk.content == chunks[0].content
+        
+        temp_db.clear()
+        assert not temp_db.content_store.path.exists()
+    
+    def test_version_tracks_writes(self, temp_db):
+        """Test that version() changes on writes, also those of another instance."""
+        chunk = Chunk(content="x = 1", file_path="/test/a.py", start_line=1, end_line=1, language="python")
+        other = VectorDB(persist_dir=str(temp_db.persist_dir), collection_name=temp_db.collection_name)
+        
+        before = temp_db.version()
+        temp_db.add_chunks([chunk], [[1.0, 0.0]])
+        after_add = temp_db.version()
+        assert after_add != before
+        
+        seen_by_other = other.version()
+        temp_db.delete_by_file("/test/a.py")
+        assert temp_db.version() != after_add
+        assert other.version() != seen_by_other
+    
+    def test_content_store_compact(self, tmp_path):
+        """Test that compaction keeps only live frames and their new offsets survive reopening."""
+        from tools.rag.content_store import ContentStore
+        
+        store = ContentStore(tmp_path / "test.content")
+        refs = store.append([b"dead" * 100, b"live", b"gone" * 100, b"also live"])
+        store.mark_dead(refs[0][1] + refs[2][1])
+        
+        moved = {}
+        store.compact([refs[1], refs[3]], moved.update)
+        
+        assert store.usage() == (0, refs[1][1] + refs[3][1])
+        new_refs = [(moved[offset], length) for offset, length in (refs[1], refs[3])]
+        reopened = ContentStore(tmp_path / "test.content")
+        frames = reopened.read(new_refs)
+        assert [frames[ref] for ref in new_refs] == [b"live", b"also live"]
+        
+        # Appends after compaction continue the logical offsets
+        (ref,) = reopened.append([b"new"])
+        assert ref[0] >= max(offset for offset, _ in new_refs)
+        assert reopened.read([ref])[ref] == b"new"
+    
+    def test_content_store_upgrades_legacy_file(self, tmp_path):
+        """Test that a store written without header keeps its offsets when a writer adds one."""
+        from tools.rag.content_store import ContentStore, _compress
+        
+        path = tmp_path / "legacy.content"
+        frames = [_compress(b"first"), _compress(b"second")]
+        path.write_bytes(b"".join(frames))
+        refs = [(0, len(frames[0])), (len(frames[0]), len(frames[1]))]
+        
+        store = ContentStore(path)
+        store.mark_dead(len(frames[0]))
+        
+        assert store.usage() == (len(frames[0]), len(frames[0]) + len(frames[1]))
+        assert store.read(refs)[refs[1]] == b"second"
+    
+    def test_content_store_shared_by_two_instances(self, temp_db):
+        """Test that one instance keeps working after another compacts the shared store."""
+        def chunks_for(file_path: str) -> list[Chunk]:
+            return [
+                Chunk(
+                    content=f"{file_path} chunk {i} " * 20,
+                    file_path=file_path,
+                    start_line=i + 1,
+                    end_line=i + 1,
+                    language="python",
+                )
+                for i in range(2)
+            ]
+        
+        for n in range(4):
+            temp_db.add_chunks(chunks_for(f"/test/file{n}.py"), [[1.0, float(n)], [1.0, float(n)]])
+        
+        other = VectorDB(persist_dir=str(temp_db.persist_dir), collection_name=temp_db.collection_name)
+        other.delete_by_files([f"/test/file{n}.py" for n in range(3)])
+        assert other.content_store.usage()[0] == 0  # Compacted
+        
+        results = temp_db.search([1.0, 3.0], n_results=2)
+        assert [r.chunk.content for r in results] == [c.content for c in chunks_for("/test/file3.py")]
+        
+        temp_db.add_chunks(chunks_for("/test/file4.py"), [[1.0, 4.0], [1.0, 4.0]])
+        fresh = VectorDB(persist_dir=str(temp_db.persist_dir), collection_name=temp_db.collection_name)
+        for n in (3, 4):
+            contents = sorted(c.content for c in fresh.get_file_chunks(f"/test/file{n}.py"))
+            assert contents == sorted(c.content for c in chunks_for(f"/test/file{n}.py"))
+    
+    def test_reindexing_does_not_grow_content_store(self, temp_db):
+        """Test that repeatedly re-indexing a file compacts its orphaned frames."""
+        def index(version: int) -> None:
+            chunks = [
+                Chunk(
+                    content=f"version {version} of chunk {i} " * 20,
+                    file_path=f"/test/file{i % 2}.py",
+                    start_line=i + 1,
+                    end_line=i + 1,
+                    language="python",
+                )
+                for i in range(4)
+            ]
+            temp_db.add_chunks(chunks, [[1.0, float(i)] for i in range(4)])
+        
+        index(0)
+        _, size = temp_db.content_store.usage()
+        for version in range(1, 20):
+            temp_db.delete_by_files(["/test/file0.py", "/test/file1.py"])
+            index(version)
+        
+        assert temp_db.content_store.usage()[1] < 3 * size
+        contents = sorted(c.content for c in temp_db.get_file_chunks("/test/file1.py"))
+        assert contents == [f"version 19 of chunk {i} " * 20 for i in (1, 3)]
+    
     def test_delete_by_file(self, temp_db):
         """Test deleting chunks by file path."""
         chunks = [
@@ -289,6 +566,27 @@ class TestVectorDB:
         stats = temp_db.get_stats()
         assert stats["total_chunks"] == 1
     
+    def test_delete_by_files(self, temp_db):
+        """Test deleting chunks of several files at once."""
+        chunks = [
+            Chunk(
+                content=f"content{i}",
+                file_path=f"/test/file{i % 3}.py",
+                start_line=i + 1,
+                end_line=i + 1,
+                language="python",
+            )
+            for i in range(6)
+        ]
+        temp_db.add_chunks(chunks, [[0.1 * (i + 1)] * 8 for i in range(6)])
+        
+        deleted = temp_db.delete_by_files(["/test/file0.py", "/test/file2.py", "/test/missing.py"])
+        
+        assert deleted == 4
+        assert temp_db.delete_by_files([]) == 0
+        assert [c.file_path for c in temp_db.get_file_chunks("/test/file1.py")] == ["/test/file1.py"] * 2
+        assert temp_db.get_stats()["total_chunks"] == 2
+    
     def test_get_file_chunks(self, temp_db):
         """Test retrieving chunks by file."""
         chunks = [
@@ -372,6 +670,534 @@ class TestVectorDB:
         
         assert len(results) == 1
         assert results[0].chunk.language == "python"
+    
+    def test_unknown_backend(self):
+        """Test that an unknown backend is rejected."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with pytest.raises(ValueError):
+                VectorDB(persist_dir=tmpdir, backend="nope")
+
+
+class TestFaissVectorDB:
+    """Tests for the FAISS vector database backend."""
+    
+    @pytest.fixture
+    def tmpdir(self):
+        """Create a temporary persist directory."""
+        pytest.importorskip("faiss")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield tmpdir
+    
+    @staticmethod
+    def make_chunks(file_path: str, n: int, language: str = "python") -> list[Chunk]:
+        """Create n one-line chunks for a file."""
+        return [
+            Chunk(
+                content=f"{file_path} {i}",
+                file_path=file_path,
+                start_line=i + 1,
+                end_line=i + 1,
+                language=language,
+            )
+            for i in range(n)
+        ]
+    
+    def test_add_search_and_filter(self, tmpdir):
+        """Test the VectorDB API on the FAISS backend."""
+        from tools.rag.vectordb_faiss import FaissVectorDB
+        
+        db = VectorDB(persist_dir=tmpdir, backend="faiss")
+        assert isinstance(db, FaissVectorDB)
+        
+        db.add_chunks(self.make_chunks("/a.py", 2), [[1.0, 0.0], [0.0, 1.0]])
+        db.add_chunks(self.make_chunks("/b.js", 1, "javascript"), [[0.9, 0.1]])
+        
+        results = db.search([1.0, 0.0], n_results=3)
+        assert [r.chunk.content for r in results] == ["/a.py 0", "/b.js 0", "/a.py 1"]
+        assert results[0].score == pytest.approx(1.0)
+        
+        results = db.search([1.0, 0.0], n_results=3, filter_language="javascript")
+        assert [r.chunk.file_path for r in results] == ["/b.js"]
+        
+        assert db.delete_by_file("/a.py") == 2
+        assert db.get_stats()["total_chunks"] == 1
+    
+    def test_upsert_and_persistence(self, tmpdir):
+        """Test that re-adding a chunk replaces it and flushed data survives reopening."""
+        db = VectorDB(persist_dir=tmpdir, backend="faiss")
+        db.add_chunks(self.make_chunks("/a.py", 2), [[1.0, 0.0], [0.0, 1.0]])
+        db.add_chunks(self.make_chunks("/a.py", 1), [[0.0, 1.0]])
+        
+        # Nothing is written until flush()
+        assert VectorDB(persist_dir=tmpdir, backend="faiss").get_stats()["total_chunks"] == 0
+        db.flush()
+        
+        reopened = VectorDB(persist_dir=tmpdir, backend="faiss")
+        assert reopened.get_stats()["total_chunks"] == 2
+        assert len(reopened.get_file_chunks("/a.py")) == 2
+        assert len(reopened.search([0.0, 1.0], n_results=5, score_threshold=0.99)) == 2
+    
+    def test_trains_ivf_index(self, tmpdir):
+        """Test that a collection past train_size is rebuilt as an IVF index."""
+        from tools.rag.vectordb_faiss import FaissVectorDB
+        
+        db = FaissVectorDB(persist_dir=tmpdir, nlist=4, pq_m=4, train_size=256, nprobe=4)
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((300, 8)).astype(np.float32)
+        db.add_chunks(self.make_chunks("/a.py", 300), embeddings)
+        
+        assert db.get_stats()["total_chunks"] == 300
+        assert len(db.search(embeddings[0], n_results=5)) == 5
+    
+    def test_filtered_search_on_ivf_index(self, tmpdir):
+        """Test that filters on a trained index return n_results hits, not only hits in the probed lists."""
+        from tools.rag.vectordb_faiss import FaissVectorDB
+        
+        db = FaissVectorDB(persist_dir=tmpdir, nlist=16, quantizer="sq8", train_size=256, nprobe=1)
+        rng = np.random.default_rng(0)
+        chunks = [
+            chunk
+            for i in range(12)
+            for chunk in self.make_chunks(f"/f{i}.py", 25)
+        ]
+        db.add_chunks(chunks, rng.standard_normal((300, 16)).astype(np.float32))
+        
+        query = rng.standard_normal(16)
+        ids, _, metadatas, _ = db.search_raw(query, n_results=20, filter_file="/f3.py")
+        assert len(ids) == 20
+        assert {metadata["file_path"] for metadata in metadatas} == {"/f3.py"}
+        assert len(db.search_raw(query, n_results=50, filter_file="/f3.py")[0]) == 25
+    
+    def test_trains_sq8_index(self, tmpdir):
+        """Test int8 scalar quantization keeps exact matches on top."""
+        from tools.rag.vectordb_faiss import FaissVectorDB
+        
+        db = FaissVectorDB(persist_dir=tmpdir, nlist=4, quantizer="sq8", train_size=256, nprobe=4)
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((300, 16)).astype(np.float32)
+        db.add_chunks(self.make_chunks("/a.py", 300), embeddings)
+        
+        results = db.search(embeddings[7], n_results=3)
+        assert results[0].chunk.start_line == 8
+        assert results[0].score == pytest.approx(1.0, abs=0.02)
+    
+    def test_content_store_methods_are_overridden(self, tmpdir):
+        """Test that ChromaDB content store maintenance is a no-op on FAISS."""
+        db = VectorDB(persist_dir=tmpdir, backend="faiss")
+        db.add_chunks(self.make_chunks("/a.py", 2), [[1.0, 0.0], [0.0, 1.0]])
+        _, _, metadatas, documents = db.search_raw([1.0, 0.0], n_results=2)
+        
+        db.compact()
+        db._compact_locked()
+        db._release_content(metadatas)
+        assert db._load_documents(documents, metadatas) == ["/a.py 0", "/a.py 1"]
+        assert db.get_stats()["total_chunks"] == 2
+    
+    def test_faiss_options_are_keyword_only(self, tmpdir):
+        """Test that FAISS options cannot be passed positionally."""
+        from tools.rag.vectordb_faiss import FaissVectorDB
+        
+        with pytest.raises(TypeError):
+            FaissVectorDB(tmpdir, "hive_codebase", "faiss", 16)
+        
+        db = VectorDB(tmpdir, "hive_codebase", "faiss", nlist=16)
+        assert db.nlist == 16
+
+
+class TestCodebaseIndexer:
+    """Tests for CodebaseIndexer file selection and hashing."""
+    
+    def test_gitignore_rules(self):
+        """Test .gitignore matching semantics."""
+        from tools.rag.indexer import CodebaseIndexer
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / ".gitignore").write_text(
+                "# comment\n*.log.py\ngenerated/\n/top.py\n!keep.log.py\nold/keep.log.py\n"
+            )
+            indexer = CodebaseIndexer(workspace_path=tmpdir)
+            root = Path(tmpdir)
+            
+            assert indexer._should_index_file(root / "src" / "main.py")
+            assert not indexer._should_index_file(root / "src" / "app.log.py")
+            assert indexer._should_index_file(root / "src" / "keep.log.py")
+            assert not indexer._should_index_file(root / "old" / "keep.log.py")
+            assert not indexer._should_index_file(root / "a" / "generated" / "x.py")
+            assert not indexer._should_index_file(root / "top.py")
+            assert indexer._should_index_file(root / "src" / "top.py")
+            assert not indexer._should_index_file(root / "node_modules" / "x.js")
+            assert not indexer._should_index_file(root / "notes.txt")
+    
+    def test_gitignore_extension_patterns(self):
+        """Test the "*.ext" fast path respects later negations."""
+        from tools.rag.indexer import CodebaseIndexer
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / ".gitignore").write_text("*.json\n!keep.json\n*.yaml\n")
+            indexer = CodebaseIndexer(workspace_path=tmpdir)
+            root = Path(tmpdir)
+            
+            assert indexer._ignore_exts == {".yaml"}
+            assert not indexer._should_index_file(root / "config.yaml")
+            assert not indexer._should_index_file(root / "data.json")
+            assert indexer._should_index_file(root / "keep.json")
+    
+    def test_collect_files_prunes_directories(self):
+        """Test that the walker skips excluded and ignored directories."""
+        from tools.rag.indexer import CodebaseIndexer
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / ".gitignore").write_text("generated/\n")
+            for relative in ("src/app.py", "src/pkg/util.py", "node_modules/lib/x.js",
+                             "src/generated/out.py", "src/notes.txt"):
+                path = root / relative
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text("x = 1\n")
+            
+            indexer = CodebaseIndexer(workspace_path=tmpdir)
+            files = sorted(p.relative_to(indexer.workspace_path).as_posix()
+                           for p in indexer._collect_files())
+        
+        assert files == ["src/app.py", "src/pkg/util.py"]
+    
+    def test_collect_files_skips_symlinks(self):
+        """Test that symlinked files and directories are not indexed."""
+        from tools.rag.indexer import CodebaseIndexer
+        
+        with tempfile.TemporaryDirectory() as tmpdir, tempfile.TemporaryDirectory() as outside:
+            root = Path(tmpdir)
+            (root / "app.py").write_text("x = 1\n")
+            (Path(outside) / "secret.py").write_text("y = 2\n")
+            (root / "alias.py").symlink_to(root / "app.py")
+            (root / "secret.py").symlink_to(Path(outside) / "secret.py")
+            (root / "linked").symlink_to(outside, target_is_directory=True)
+            
+            indexer = CodebaseIndexer(workspace_path=tmpdir)
+            files = [p.name for p in indexer._collect_files()]
+        
+        assert files == ["app.py"]
+    
+    @pytest.mark.asyncio
+    async def test_index_full_pipeline(self):
+        """Test that index_full embeds chunks from many files in shared batches."""
+        from tools.rag.indexer import CodebaseIndexer
+        
+        class FakeEmbeddingService:
+            def __init__(self):
+                self.batches = []
+            
+            async def embed_batch(self, texts, show_progress=False):
+                self.batches.append(len(texts))
+                return np.ones((len(texts), 8), dtype=np.float32)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            for i in range(10):
+                (root / f"mod{i}.py").write_text(f"def func{i}():\n    return {i}\n")
+            
+            service = FakeEmbeddingService()
+            indexer = CodebaseIndexer(workspace_path=tmpdir, embedding_service=service)
+            stats = await indexer.index_full()
+            
+            assert stats["files_indexed"] == 10
+            assert stats["chunks_created"] == 10
+            assert service.batches == [10]
+            assert indexer.get_status()["indexed_files"] == 10
+    
+    @pytest.mark.asyncio
+    async def test_index_changed_files_skips_unchanged_stats(self, monkeypatch):
+        """Test that files with unchanged size and mtime are not re-hashed."""
+        import tools.rag.indexer as indexer_module
+        from tools.rag.indexer import CodebaseIndexer
+        
+        class FakeEmbeddingService:
+            async def embed_batch(self, texts, show_progress=False):
+                return np.ones((len(texts), 8), dtype=np.float32)
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            for i in range(3):
+                (root / f"mod{i}.py").write_text(f"def func{i}():\n    return {i}\n")
+            
+            indexer = CodebaseIndexer(
+                workspace_path=tmpdir, embedding_service=FakeEmbeddingService()
+            )
+            await indexer.index_full()
+            
+            hashed = []
+            real_hash_paths = indexer_module._hash_paths
+            
+            def spy(paths):
+                hashed.extend(paths)
+                return real_hash_paths(paths)
+            
+            monkeypatch.setattr(indexer_module, "_hash_paths", spy)
+            (root / "mod1.py").write_text("def func1():\n    return 'changed'\n")
+            
+            stats = await indexer.index_changed_files()
+        
+        assert stats["files_changed"] == 1
+        assert [p.name for p in hashed] == ["mod1.py"]
+    
+    def test_hash_paths_parallel(self):
+        """Test that concurrent hashing matches per-file hashing."""
+        from tools.rag.indexer import _hash_path, _hash_paths
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for i in range(5):
+                path = Path(tmpdir) / f"file{i}.py"
+                path.write_text(f"x = {i}\n" * (i + 1))
+                paths.append(path)
+            missing = Path(tmpdir) / "missing.py"
+            
+            hashes = _hash_paths(paths + [missing])
+            
+            assert set(hashes) == set(paths)
+            for path in paths:
+                assert hashes[path] == _hash_path(path)
+            assert len(set(hashes.values())) == len(paths)
+    
+    def test_metadata_from_other_hash_algo_is_stale(self):
+        """Test that fingerprints from another algorithm force a re-index."""
+        from tools.rag.indexer import CodebaseIndexer, HASH_ALGO
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / "mod.py").write_text("x = 1\n")
+            indexer = CodebaseIndexer(workspace_path=tmpdir)
+            # Metadata as written by a version that hashed with md5
+            indexer.meta_file.write_text(json.dumps({
+                "last_indexed": None,
+                "file_hashes": {"mod.py": "0" * 32},
+                "total_chunks": 1,
+            }))
+            
+            metadata = indexer._load_metadata()
+            
+            assert metadata["hash_algo"] == HASH_ALGO
+            assert metadata["file_hashes"] == {"mod.py": ""}
+            assert indexer.needs_reindex(Path(tmpdir) / "mod.py")
+    
+    def test_metadata_cached_until_file_changes(self):
+        """Test that metadata is parsed once and re-read after external writes."""
+        from tools.rag.indexer import CodebaseIndexer
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            indexer = CodebaseIndexer(workspace_path=tmpdir)
+            metadata = indexer._load_metadata()
+            metadata["file_hashes"]["a.py"] = "abc"
+            indexer._save_metadata(metadata)
+            
+            assert indexer._load_metadata() == metadata
+            
+            data = json.loads(indexer.meta_file.read_text())
+            data["file_hashes"]["b.py"] = "def"
+            indexer.meta_file.write_text(json.dumps(data, indent=4))
+            
+            assert set(indexer._load_metadata()["file_hashes"]) == {"a.py", "b.py"}
+    
+    def test_unsaved_metadata_changes_not_cached(self):
+        """Test that edits to loaded metadata are dropped if it is never saved."""
+        from tools.rag.indexer import CodebaseIndexer
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            indexer = CodebaseIndexer(workspace_path=tmpdir)
+            metadata = indexer._load_metadata()
+            metadata["file_hashes"]["a.py"] = "abc"
+            indexer._save_metadata(metadata)
+            
+            # An indexing run that fails before saving
+            metadata = indexer._load_metadata()
+            metadata["file_hashes"]["b.py"] = "def"
+            metadata["file_stats"]["b.py"] = [1, 2]
+            metadata["total_chunks"] = 99
+            
+            metadata = indexer._load_metadata()
+            assert metadata["file_hashes"] == {"a.py": "abc"}
+            assert metadata["file_stats"] == {}
+            assert metadata["total_chunks"] == 0
+
+
+class TestRAGSearchTool:
+    """Tests for RAGSearchTool."""
+    
+    @pytest.mark.asyncio
+    async def test_query_embeddings_cached(self):
+        """Test that repeated queries reuse the cached query embedding."""
+        class FakeEmbeddingService:
+            calls = 0
+            
+            async def embed_text(self, text):
+                FakeEmbeddingService.calls += 1
+                return np.ones(4, dtype=np.float32)
+        
+        class FakeVectorDB:
+            searches = 0
+            
+            def version(self):
+                return 0
+            
+            def search(self, **kwargs):
+                FakeVectorDB.searches += 1
+                return []
+        
+        tool = RAGSearchTool(embedding_service=FakeEmbeddingService(), vectordb=FakeVectorDB())
+        
+        first = await tool.execute(query="where is auth", n_results=5)
+        second = await tool.execute(query="where is auth", n_results=5)
+        third = await tool.execute(query="where is auth", n_results=10)
+        
+        assert first.success and second == first and third.success
+        assert FakeEmbeddingService.calls == 1
+        assert FakeVectorDB.searches == 2
+    
+    @pytest.mark.asyncio
+    async def test_result_cache_follows_vectordb_changes(self):
+        """Test that cached results are dropped on DB changes and handed out as copies."""
+        class FakeEmbeddingService:
+            async def embed_text(self, text):
+                return np.ones(4, dtype=np.float32)
+        
+        class FakeVectorDB:
+            searches = 0
+            mutations = 0
+            
+            def version(self):
+                return self.mutations
+            
+            def search(self, **kwargs):
+                self.searches += 1
+                return []
+        
+        db = FakeVectorDB()
+        tool = RAGSearchTool(embedding_service=FakeEmbeddingService(), vectordb=db)
+        
+        first = await tool.execute(query="where is auth")
+        first.metadata["mutated"] = True
+        second = await tool.execute(query="where is auth")
+        assert db.searches == 1
+        assert second is not first and "mutated" not in second.metadata
+        
+        db.mutations += 1
+        await tool.execute(query="where is auth")
+        assert db.searches == 2
+    
+    @pytest.mark.asyncio
+    async def test_version_error_returns_error_result(self):
+        """Test that a failing version check is reported, not raised."""
+        from tools.base import ToolResultStatus
+        
+        class FakeVectorDB:
+            def version(self):
+                raise FileNotFoundError("content store vanished")
+        
+        tool = RAGSearchTool(embedding_service=object(), vectordb=FakeVectorDB())
+        
+        result = await tool.execute(query="where is auth")
+        
+        assert result.status == ToolResultStatus.ERROR
+        assert "content store vanished" in result.error
+    
+    def test_format_results(self):
+        """Test the result layout handed to the LLM."""
+        tool = RAGSearchTool()
+        item = {"file": "a.py", "lines": "1-2", "language": "python", "type": "function",
+                "score": 0.9, "content": "def f():\n    pass"}
+        
+        output = tool._format_results([{**item, "rank": 1}, {**item, "rank": 2}])
+        
+        block = "(lines 1-2)\nLanguage: python | Type: function | Score: 0.9\n```python\ndef f():\n    pass\n```\n"
+        assert output == (
+            "Found 2 relevant code snippets:\n\n"
+            f"### 1. a.py {block}\n"
+            f"### 2. a.py {block}"
+        )
+        assert tool._format_results([]) == "No relevant code found."
+
+
+class FakeTokenizer:
+    """Tokenizer with one token per character."""
+    
+    def encode(self, text):
+        return [ord(c) for c in text]
+    
+    def encode_ordinary_batch(self, texts):
+        return [self.encode(text) for text in texts]
+    
+    def decode(self, tokens):
+        return "".join(map(chr, tokens))
+
+
+class FakeEmbeddingsAPI:
+    """Records embeddings.create calls; vectors encode the embedded text."""
+    
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def create(self, model, input, dimensions):
+        self.calls.append(list(input))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return SimpleNamespace(data=[
+            SimpleNamespace(embedding=[len(text), ord(text[0]), ord(text[-1]), 1.0])
+            for text in input
+        ])
+
+
+class TestEmbeddingServiceOffline:
+    """Tests for EmbeddingService batching and caching with a fake client."""
+    
+    @pytest.fixture
+    def make_service(self, monkeypatch, tmp_path):
+        """Build services with a fake tokenizer and API sharing one cache file."""
+        from tools.rag import embeddings
+        
+        monkeypatch.setattr(embeddings.tiktoken, "encoding_for_model", lambda model: FakeTokenizer())
+        
+        def make(**kwargs):
+            service = embeddings.EmbeddingService(api_key="test", dimensions=4, **kwargs)
+            service.client = SimpleNamespace(embeddings=FakeEmbeddingsAPI())
+            return service
+        
+        return make
+    
+    @pytest.mark.asyncio
+    async def test_embed_batch_cached(self, make_service, tmp_path):
+        """Test that cached texts make no API call, also for a new service on the same cache."""
+        service = make_service(cache_path=str(tmp_path / "cache.db"))
+        api = service.client.embeddings
+        
+        first = await service.embed_batch(["Hello", "World", "Hello"])
+        assert api.calls == [["Hello", "World"]]
+        
+        second = await service.embed_batch(["World", "Hello"])
+        assert len(api.calls) == 1
+        assert np.array_equal(second, first[[1, 0]])
+        
+        reopened = make_service(cache_path=str(tmp_path / "cache.db"))
+        await reopened.embed_batch(["Hello", "New"])
+        assert reopened.client.embeddings.calls == [["New"]]
+    
+    @pytest.mark.asyncio
+    async def test_embed_batch_splits_and_truncates(self, make_service):
+        """Test that large inputs are split into concurrent batches and truncated to the token budget."""
+        service = make_service(batch_size=2, max_concurrency=2)
+        service.max_tokens = 5
+        api = service.client.embeddings
+        texts = ["a", "bb", "ccccccccc", "dd", "e"]
+        
+        result = await service.embed_batch(texts)
+        
+        assert api.calls == [["a", "bb"], ["ccccc", "dd"], ["e"]]
+        assert api.max_in_flight == 2
+        assert result.shape == (5, 4)
+        assert result[:, 0].tolist() == [1, 2, 5, 2, 1]
+        assert result[:, 1].tolist() == [ord(t[0]) for t in texts]
 
 
 # Skip embedding tests by default (require API key)
@@ -387,8 +1213,8 @@ class TestEmbeddingService:
         service = EmbeddingService()
         embedding = await service.embed_text("Hello world")
         
-        assert len(embedding) == 1536
-        assert all(isinstance(x, float) for x in embedding)
+        assert embedding.shape == (1536,)
+        assert embedding.dtype == np.float32
     
     @pytest.mark.asyncio
     async def test_embed_batch(self):
@@ -399,8 +1225,8 @@ class TestEmbeddingService:
         texts = ["Hello", "World", "Test"]
         embeddings = await service.embed_batch(texts)
         
-        assert len(embeddings) == 3
-        assert all(len(e) == 1536 for e in embeddings)
+        assert embeddings.shape == (3, 1536)
+        assert embeddings.dtype == np.float32
     
     def test_count_tokens(self):
         """Test token counting."""
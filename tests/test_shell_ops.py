@@ -1,9 +1,12 @@
 """Tests for shell operation tools."""
 
+import asyncio
+import os
+
 import pytest
 from pathlib import Path
 
-from tools.shell_ops import RunCommandTool, is_command_allowed
+from tools.shell_ops import RunCommandTool, get_run_command_tool, is_command_allowed
 from tools.base import ToolResultStatus
 
 
@@ -33,6 +36,12 @@ class TestCommandValidation:
         assert not allowed
         assert "Blocked pattern" in reason
 
+    def test_blocked_pattern_in_chained_command(self):
+        """Should block dangerous patterns anywhere in the command."""
+        allowed, reason = is_command_allowed("pytest tests/ && SUDO reboot")
+        assert not allowed
+        assert "Blocked pattern" in reason
+
     def test_blocked_unknown_command(self):
         """Should block non-whitelisted commands."""
         allowed, reason = is_command_allowed("dangerous_script.sh")
@@ -44,6 +53,33 @@ class TestCommandValidation:
         allowed, reason = is_command_allowed("/usr/bin/pytest tests/")
         assert allowed
 
+    def test_blocked_pattern_case_insensitive_regex(self, monkeypatch):
+        """Should block mixed-case patterns and report them as configured."""
+        from tools import shell_ops
+        
+        monkeypatch.setattr(shell_ops, "_BLOCKED_AC", None)
+        allowed, reason = is_command_allowed.__wrapped__("ls && CHMOD -r 777 .")
+        assert not allowed
+        assert "'chmod -R 777'" in reason
+
+    def test_blocked_pattern_case_insensitive_automaton(self, monkeypatch):
+        """Should block mixed-case patterns on the pyahocorasick path too."""
+        pytest.importorskip("ahocorasick")
+        from tools import shell_ops
+        
+        monkeypatch.setattr(shell_ops, "_BLOCKED_AC", shell_ops._build_blocked_automaton())
+        allowed, reason = is_command_allowed.__wrapped__("ls && chmod -R 777 .")
+        assert not allowed
+        assert "'chmod -R 777'" in reason
+
+    def test_validation_is_cached(self):
+        """Should answer repeated validations from the cache."""
+        is_command_allowed.cache_clear()
+        first = is_command_allowed("npm run build")
+        second = is_command_allowed("npm run build")
+        assert first == second == (True, None)
+        assert is_command_allowed.cache_info().hits == 1
+
 
 class TestRunCommandTool:
     """Tests for RunCommandTool."""
@@ -52,6 +88,13 @@ class TestRunCommandTool:
     def tool(self, temp_dir):
         return RunCommandTool(workspace_path=str(temp_dir))
 
+    def test_tool_shared_per_workspace(self, temp_dir):
+        """Should reuse one tool instance per workspace."""
+        tool = get_run_command_tool(str(temp_dir))
+        assert get_run_command_tool(str(temp_dir)) is tool
+        assert get_run_command_tool(str(temp_dir / "other")) is not tool
+        assert tool.workspace_path == str(temp_dir)
+
     async def test_run_simple_command(self, tool):
         """Should run a simple allowed command."""
         result = await tool.execute(command="echo hello")
@@ -60,6 +103,14 @@ class TestRunCommandTool:
         assert "hello" in result.output
         assert result.metadata["exit_code"] == 0
 
+    async def test_run_inherits_environment(self, tool, monkeypatch):
+        """Should see environment changes made after import."""
+        monkeypatch.setenv("HIVE_TEST_MARKER", "marker-value")
+        result = await tool.execute(command="env | grep HIVE_TEST_MARKER")
+        
+        assert result.success
+        assert "HIVE_TEST_MARKER=marker-value" in result.output
+
     async def test_run_command_with_exit_code(self, tool, temp_dir):
         """Should capture non-zero exit codes."""
         # Create a file to grep for non-existent content
@@ -101,6 +152,14 @@ class TestRunCommandTool:
         assert result.success
         assert "test.txt" in result.output
 
+    async def test_run_rejects_cwd_outside_workspace(self, tool):
+        """Should refuse working directories that escape the workspace."""
+        for cwd in ("..", "/tmp"):
+            result = await tool.execute(command="ls", cwd=cwd)
+            
+            assert result.status == ToolResultStatus.ERROR
+            assert "nicht erlaubt" in result.error
+
     async def test_run_with_timeout(self, tool):
         """Should handle timeout properly."""
         # This should complete quickly, just testing the parameter works
@@ -112,6 +171,35 @@ class TestRunCommandTool:
         assert result.success
         assert "fast" in result.output
 
+    async def test_timeout_kills_process_group(self, tool, temp_dir):
+        """Should kill processes started by the command on timeout."""
+        result = await tool.execute(
+            command="python -c \"import subprocess; p = subprocess.Popen(['sleep', '30']); "
+                    "open('child.pid', 'w').write(str(p.pid)); p.wait()\"",
+            timeout=5,
+        )
+        
+        assert result.status == ToolResultStatus.ERROR
+        assert result.metadata["timeout"]
+        
+        child_pid = int((temp_dir / "child.pid").read_text())
+        for _ in range(50):
+            try:
+                os.kill(child_pid, 0)
+            except ProcessLookupError:
+                break
+            await asyncio.sleep(0.05)
+        else:
+            pytest.fail("grandchild process survived the timeout")
+
+    async def test_run_truncates_large_output(self, tool):
+        """Should keep only the head of very large output."""
+        result = await tool.execute(command="python -c \"print('x' * 200000)\"")
+        
+        assert result.success
+        assert "x" * 10000 + "\n... (truncated)" in result.output
+        assert "x" * 10001 not in result.output
+
     async def test_run_pytest_command(self, tool, temp_dir):
         """Should allow running pytest."""
         # Create a simple test file
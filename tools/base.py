@@ -151,7 +151,7 @@ class ToolRegistry:
             GitResetTool,
             GitCheckoutFileTool,
         )
-        from .shell_ops import RunCommandTool
+        from .shell_ops import get_run_command_tool
         
         # File tools
         self.register(ReadFileTool(workspace_path))
@@ -177,7 +177,7 @@ class ToolRegistry:
         self.register(GitCheckoutFileTool(workspace_path))
         
         # Shell tools
-        self.register(RunCommandTool(workspace_path))
+        self.register(get_run_command_tool(workspace_path))
     
     def register_rag_tool(self, workspace_path: Optional[str] = None) -> bool:
         """
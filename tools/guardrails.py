@@ -4,15 +4,23 @@ Guardrails for safe file operations.
 Provides path validation, protected path detection, and audit logging.
 """
 
+import atexit
 import logging
 import os
 import re
+import sys
+import threading
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
-# Protected paths that should never be modified/deleted
-PROTECTED_PATHS = {
+logger = logging.getLogger(__name__)
+
+# Protected paths that should never be modified/deleted.
+# Interned so set lookups against split path components can hit on identity.
+PROTECTED_PATHS = frozenset(sys.intern(p) for p in {
     # Version control
     ".git",
     ".gitignore",
@@ -50,7 +58,7 @@ PROTECTED_PATHS = {
     "build",
     ".tox",
     ".nox",
-}
+})
 
 # Patterns for protected files (regex)
 PROTECTED_PATTERNS = [
@@ -64,6 +72,8 @@ PROTECTED_PATTERNS = [
 class PathValidator:
     """Validates paths for safety."""
     
+    __slots__ = ("workspace_path",)
+    
     def __init__(self, workspace_path: Optional[str] = None):
         """
         Initialize path validator.
@@ -131,23 +141,21 @@ class PathValidator:
         Returns:
             Tuple of (is_protected, reason)
         """
-        path_obj = Path(path)
-        path_str = str(path)
-        
-        # Check exact matches
-        for protected in PROTECTED_PATHS:
-            # Check if path IS the protected item
-            if path_obj.name == protected:
-                return True, f"Protected path: {protected}"
-            
-            # Check if path is INSIDE a protected directory
-            parts = path_obj.parts
-            if protected in parts:
-                return True, f"Path inside protected directory: {protected}"
+        # Scan components left to right, stopping at the first protected one
+        parts = str(path).replace(os.sep, "/").rstrip("/").split("/")
+        last = len(parts) - 1
+        for i, part in enumerate(parts):
+            if part in PROTECTED_PATHS:
+                # Path IS the protected item
+                if i == last:
+                    return True, f"Protected path: {part}"
+                # Path is INSIDE a protected directory
+                return True, f"Path inside protected directory: {part}"
         
         # Check patterns
+        name = parts[last]
         for pattern in PROTECTED_PATTERNS:
-            if re.match(pattern, path_obj.name):
+            if re.match(pattern, name):
                 return True, f"Matches protected pattern: {pattern}"
         
         return False, None
@@ -244,7 +252,25 @@ class PathValidator:
 
 
 class AuditLogger:
-    """Logs all file operations for audit trail."""
+    """
+    Logs all file operations for audit trail.
+    
+    Entries are queued by log() and appended to the file in batches by a
+    background writer thread. Call flush() to write pending entries now,
+    close() to also stop the thread.
+    """
+    
+    __slots__ = (
+        "workspace_path",
+        "log_file",
+        "max_size",
+        "_queue",
+        "_lock",
+        "_write_lock",
+        "_wake",
+        "_worker",
+        "_stop",
+    )
     
     def __init__(
         self,
@@ -269,6 +295,14 @@ class AuditLogger:
         
         self.max_size = max_size_mb * 1024 * 1024
         self._ensure_log_dir()
+        
+        # Pending lines, guarded by _lock; _write_lock keeps batches in order
+        self._queue: deque[str] = deque()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._stop: Optional[threading.Event] = None
     
     def _ensure_log_dir(self) -> None:
         """Ensure log directory exists."""
@@ -313,8 +347,6 @@ class AuditLogger:
             result: Result (success, blocked, error)
             details: Optional additional details
         """
-        self._rotate_if_needed()
-        
         timestamp = datetime.now().isoformat()
         
         # Format: [timestamp] [agent] [tool] [action] [result] path | details
@@ -323,8 +355,61 @@ class AuditLogger:
             log_line += f" | {details}"
         log_line += "\n"
         
-        with open(self.log_file, "a") as f:
-            f.write(log_line)
+        with self._lock:
+            self._queue.append(log_line)
+            if self._worker is None:
+                self._start_worker()
+        self._wake.set()
+    
+    def _start_worker(self) -> None:
+        """Start the background writer thread (caller holds _lock)."""
+        self._stop = threading.Event()
+        self._worker = threading.Thread(
+            target=self._run_worker,
+            args=(self._stop,),
+            name=f"audit-writer-{self.log_file.name}",
+            daemon=True,
+        )
+        self._worker.start()
+        # Daemon threads are killed at exit, so drain whatever is left
+        atexit.register(self.flush)
+    
+    def _run_worker(self, stop: threading.Event) -> None:
+        """Drain queued entries whenever log() signals new work, until stopped."""
+        while not stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                logger.error(f"Audit log write failed: {e}")
+    
+    def close(self) -> None:
+        """Stop the background writer thread and write pending entries."""
+        with self._lock:
+            worker, stop = self._worker, self._stop
+            self._worker = self._stop = None
+            if worker is not None:
+                atexit.unregister(self.flush)
+        
+        if worker is not None:
+            stop.set()
+            self._wake.set()
+            worker.join()
+        self.flush()
+    
+    def flush(self) -> None:
+        """Write all pending entries to the log file."""
+        with self._write_lock:
+            with self._lock:
+                if not self._queue:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+            
+            self._rotate_if_needed()
+            with open(self.log_file, "a") as f:
+                f.write("".join(batch))
     
     def get_recent(self, n: int = 20) -> list[str]:
         """
@@ -336,6 +421,8 @@ class AuditLogger:
         Returns:
             List of log lines (most recent last)
         """
+        self.flush()
+        
         if not self.log_file.exists():
             return []
         
@@ -345,22 +432,23 @@ class AuditLogger:
         return lines[-n:]
 
 
-# Singleton instances for easy access
-_validator: Optional[PathValidator] = None
-_audit_logger: Optional[AuditLogger] = None
+# Singleton instances for easy access, one per workspace.
+# lru_cache makes creation atomic and avoids re-comparing workspace paths.
+@lru_cache(maxsize=None)
+def _make_validator(workspace_path: Optional[str]) -> PathValidator:
+    return PathValidator(workspace_path)
+
+
+@lru_cache(maxsize=None)
+def _make_audit_logger(workspace_path: Optional[str]) -> AuditLogger:
+    return AuditLogger(workspace_path)
 
 
 def get_validator(workspace_path: Optional[str] = None) -> PathValidator:
-    """Get or create path validator singleton."""
-    global _validator
-    if _validator is None or (workspace_path and str(_validator.workspace_path) != workspace_path):
-        _validator = PathValidator(workspace_path)
-    return _validator
+    """Get or create path validator singleton for a workspace."""
+    return _make_validator(workspace_path)
 
 
 def get_audit_logger(workspace_path: Optional[str] = None) -> AuditLogger:
-    """Get or create audit logger singleton."""
-    global _audit_logger
-    if _audit_logger is None or workspace_path:
-        _audit_logger = AuditLogger(workspace_path)
-    return _audit_logger
+    """Get or create audit logger singleton for a workspace."""
+    return _make_audit_logger(workspace_path)
@@ -1,5 +1,6 @@
 """MCP Tool wrappers for Hive Agent Swarm."""
 
+from functools import cached_property
 from typing import Optional, Any
 import logging
 
@@ -9,6 +10,16 @@ from core.mcp.client import MCPClient
 
 logger = logging.getLogger(__name__)
 
+# Map JSON Schema types to our types
+_JSON_TYPE_MAP = {
+    "string": "string",
+    "integer": "integer",
+    "number": "number",
+    "boolean": "boolean",
+    "array": "array",
+    "object": "object",
+}
+
 
 class MCPTool(Tool):
     """
@@ -17,6 +28,16 @@ class MCPTool(Tool):
     Dynamically created based on MCP tool schema from server.
     """
     
+    # description/parameters are cached properties and live in the
+    # instance __dict__ inherited from Tool, so they are not slotted.
+    __slots__ = (
+        "_mcp_client",
+        "_tool_schema",
+        "_server_name",
+        "name",
+        "workspace_path",
+    )
+    
     def __init__(
         self,
         mcp_client: MCPClient,
@@ -28,14 +49,22 @@ class MCPTool(Tool):
         self._tool_schema = tool_schema
         self._server_name = server_name
         
-        # Set tool properties
+        # Set tool properties (description/parameters are built lazily)
         self.name = f"mcp_{server_name}_{tool_schema.name}"
-        self.description = self._build_description()
-        self.parameters = self._convert_parameters()
         
         # Base class attributes
         self.workspace_path = None
     
+    @cached_property
+    def description(self) -> str:
+        """Tool description, built on first access."""
+        return self._build_description()
+    
+    @cached_property
+    def parameters(self) -> list[ToolParameter]:
+        """Tool parameters, converted from the MCP schema on first access."""
+        return self._convert_parameters()
+    
     def _build_description(self) -> str:
         """Build tool description from MCP schema."""
         desc = self._tool_schema.description or f"MCP tool: {self._tool_schema.name}"
@@ -43,36 +72,23 @@ class MCPTool(Tool):
     
     def _convert_parameters(self) -> list[ToolParameter]:
         """Convert MCP input schema to Hive ToolParameters."""
-        params = []
-        
-        if not self._tool_schema.input_schema:
-            return params
+        input_schema = self._tool_schema.input_schema
+        if not input_schema:
+            return []
         
-        properties = self._tool_schema.input_schema.get("properties", {})
-        required = self._tool_schema.input_schema.get("required", [])
+        properties = input_schema.get("properties", {})
+        required = frozenset(input_schema.get("required", ()))
         
-        for name, prop in properties.items():
-            param_type = prop.get("type", "string")
-            
-            # Map JSON Schema types to our types
-            type_mapping = {
-                "string": "string",
-                "integer": "integer",
-                "number": "number",
-                "boolean": "boolean",
-                "array": "array",
-                "object": "object",
-            }
-            
-            params.append(ToolParameter(
+        return [
+            ToolParameter(
                 name=name,
-                type=type_mapping.get(param_type, "string"),
+                type=_JSON_TYPE_MAP.get(prop.get("type", "string"), "string"),
                 description=prop.get("description", ""),
                 required=name in required,
                 default=prop.get("default"),
-            ))
-        
-        return params
+            )
+            for name, prop in properties.items()
+        ]
     
     async def execute(self, **kwargs) -> ToolResult:
         """Execute the MCP tool and return result."""
@@ -4,13 +4,18 @@ Code Chunker for RAG.
 Splits code files into semantic chunks for embedding.
 """
 
+import os
 import re
-from dataclasses import dataclass, field
-from pathlib import Path
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 
+import tiktoken
 
-@dataclass
+
+@dataclass(slots=True)
 class Chunk:
     """A chunk of code or text with metadata."""
     content: str
@@ -19,7 +24,7 @@ class Chunk:
     end_line: int
     language: str
     chunk_type: str = "code"  # code, function, class, markdown, etc.
-    metadata: dict = field(default_factory=dict)
+    metadata: Optional[dict] = None  # Only allocated when there is metadata
     
     @property
     def id(self) -> str:
@@ -35,7 +40,7 @@ class Chunk:
             "end_line": self.end_line,
             "language": self.language,
             "chunk_type": self.chunk_type,
-            "metadata": self.metadata,
+            "metadata": self.metadata or {},
         }
 
 
@@ -66,6 +71,125 @@ EXTENSION_TO_LANGUAGE = {
     ".hpp": "cpp",
 }
 
+# Files larger than this (in characters, or bytes on disk) are not split;
+# they get a single chunk holding their head. Generated fixtures and
+# bundles this size are not useful to embed in full.
+MAX_FILE_SIZE = 1_000_000
+
+# Average line length above which a file is treated as minified. Only
+# applied to files much larger than a chunk, so short one-liners are kept.
+MINIFIED_LINE_LENGTH = 400
+
+# Patterns compiled once at import. Definition patterns scan the whole
+# source in MULTILINE mode; [^\S\n] keeps matches on a single line.
+# Decorators are not part of the pattern: a repeated decorator group
+# backtracks quadratically on long runs of "@" lines without a definition,
+# so _find_python_definitions() walks back over them line by line instead.
+_PY_DEF_RE = re.compile(
+    r"^(?:(?P<function>(?:async[^\S\n]+)?def)|(?P<class>class))[^\S\n]+\w",
+    re.MULTILINE,
+)
+_MD_HEADING_RE = re.compile(r"^(#{1,6})[^\S\n]+(.+)", re.MULTILINE)
+# One alternation for function, arrow-const and class definitions, sharing
+# the indentation/export prefix so each line is tried once.
+_JS_DEF_RE = re.compile(
+    r"^[^\S\n]*(?:export[^\S\n]+)?(?:"
+    r"(?:async[^\S\n]+)?function[^\S\n]+\w"
+    r"|const[^\S\n]+\w+[^\S\n]*=[^\S\n]*(?:async[^\S\n]+)?\("
+    r"|class[^\S\n]+\w"
+    r")",
+    re.MULTILINE,
+)
+_NEWLINE_RE = re.compile(r"\n")
+
+
+def _line_offsets(content: str) -> list[int]:
+    """
+    Get the start offset of every line, plus a sentinel past the end.
+    
+    Line ``n`` (1-based) is ``content[offsets[n - 1]:offsets[n] - 1]``.
+    """
+    offsets = [0]
+    offsets.extend(m.end() for m in _NEWLINE_RE.finditer(content))
+    offsets.append(len(content) + 1)
+    return offsets
+
+
+def _iter_line_matches(pattern: re.Pattern, content: str):
+    """Scan content once, yielding (1-based line number, match) pairs."""
+    line = 1
+    pos = 0
+    for match in pattern.finditer(content):
+        start = match.start()
+        line += content.count("\n", pos, start)
+        pos = start
+        yield line, match
+
+
+def _find_definitions(pattern: re.Pattern, content: str) -> dict[int, str]:
+    """
+    Map 1-based line numbers to definition kinds.
+    
+    The kind is the name of the matched group, or "function" if unnamed.
+    """
+    return {
+        line: match.lastgroup or "function"
+        for line, match in _iter_line_matches(pattern, content)
+    }
+
+
+def _find_python_definitions(content: str) -> dict[int, str]:
+    """
+    Map 1-based line numbers of top-level Python definitions to their kinds.
+    
+    A decorated definition starts at its first decorator. Decorator
+    arguments may continue on indented or closing-bracket lines.
+    """
+    definitions = {}
+    for line, match in _iter_line_matches(_PY_DEF_RE, content):
+        start_line = line
+        pos = match.start()
+        while pos:
+            # Step back to the start of the previous line
+            pos = content.rfind("\n", 0, pos - 1) + 1
+            line -= 1
+            first = content[pos]
+            if first == "@":
+                start_line = line
+            elif first in ")]}" or (first != "\n" and first.isspace()):
+                continue
+            else:
+                break
+        definitions[start_line] = match.lastgroup
+    return definitions
+
+
+def _is_blank(text: str) -> bool:
+    """Check for empty or whitespace-only text without building a stripped copy."""
+    return not text or text.isspace()
+
+
+def _read_file(file_path: str, limit: Optional[int] = None) -> str:
+    """
+    Read a file as UTF-8 text with universal newlines.
+    
+    Undecodable bytes are dropped. If limit is given, only the first limit
+    bytes are read.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read(limit)
+    content = data.decode("utf-8", errors="ignore")
+    
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+@lru_cache(maxsize=None)
+def _language_for_suffix(suffix: str) -> str:
+    """Map a file suffix to a language name."""
+    return EXTENSION_TO_LANGUAGE.get(suffix.lower(), "text")
+
 
 class CodeChunker:
     """
@@ -80,6 +204,7 @@ class CodeChunker:
         chunk_size: int = 500,
         chunk_overlap: int = 50,
         min_chunk_size: int = 100,
+        tokenizer: Optional[tiktoken.Encoding] = None,
     ):
         """
         Initialize chunker.
@@ -88,15 +213,17 @@ class CodeChunker:
             chunk_size: Target characters per chunk
             chunk_overlap: Overlap between consecutive chunks
             min_chunk_size: Minimum chunk size (smaller chunks are merged)
+            tokenizer: Optional tokenizer; if given, min_chunk_size is
+                measured in tokens instead of characters
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.min_chunk_size = min_chunk_size
+        self.tokenizer = tokenizer
     
     def detect_language(self, file_path: str) -> str:
         """Detect language from file extension."""
-        ext = Path(file_path).suffix.lower()
-        return EXTENSION_TO_LANGUAGE.get(ext, "text")
+        return _language_for_suffix(os.path.splitext(file_path)[1])
     
     def chunk_file(self, file_path: str, content: Optional[str] = None) -> list[Chunk]:
         """
@@ -110,12 +237,22 @@ class CodeChunker:
             List of Chunk objects
         """
         if content is None:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
+            if os.path.getsize(file_path) > MAX_FILE_SIZE:
+                # Don't read all of a file that will not be split anyway
+                return self._chunk_head(file_path, _read_file(file_path, self.chunk_size))
+            content = _read_file(file_path)
         
-        if not content.strip():
+        if _is_blank(content):
             return []
         
+        # Oversized or minified files: one coarse chunk, no line-level work
+        size = len(content)
+        if size > MAX_FILE_SIZE or (
+            size > 10 * self.chunk_size
+            and size > MINIFIED_LINE_LENGTH * (content.count("\n") + 1)
+        ):
+            return self._chunk_head(file_path, content)
+        
         language = self.detect_language(file_path)
         
         # Choose chunking strategy based on language
@@ -133,157 +270,158 @@ class CodeChunker:
         
         return chunks
     
+    def chunk_files(
+        self,
+        file_paths: list[str],
+        max_workers: Optional[int] = None,
+    ) -> dict[str, list[Chunk]]:
+        """
+        Chunk many files in parallel worker processes.
+        
+        Args:
+            file_paths: Paths of the files to chunk
+            max_workers: Number of worker processes (defaults to CPU count)
+            
+        Returns:
+            Dict mapping each file path to its chunks
+        """
+        workers = max_workers or os.cpu_count() or 1
+        if len(file_paths) <= 1 or workers == 1:
+            return {path: self.chunk_file(path) for path in file_paths}
+        
+        # Hand each worker several files per task to amortize IPC cost
+        batch = max(1, len(file_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self.chunk_file, file_paths, chunksize=batch)
+            return dict(zip(file_paths, results))
+    
+    def _chunk_head(self, file_path: str, content: str) -> list[Chunk]:
+        """Make a single chunk from the first chunk_size characters of content."""
+        head = content[:self.chunk_size]
+        if _is_blank(head):
+            return []
+        return [Chunk(
+            content=head,
+            file_path=file_path,
+            start_line=1,
+            end_line=head.count("\n") + 1,
+            language=self.detect_language(file_path),
+            chunk_type="code",
+            metadata={"truncated": True},
+        )]
+    
     def _chunk_python(self, file_path: str, content: str) -> list[Chunk]:
         """Chunk Python file by functions and classes."""
-        chunks = []
-        lines = content.split("\n")
+        # Top-level definitions (from their first decorator line) found in
+        # one pass over the source
+        definitions = _find_python_definitions(content)
+        return self._chunk_by_definitions(file_path, content, "python", definitions)
+    
+    def _chunk_javascript(self, file_path: str, content: str) -> list[Chunk]:
+        """Chunk JavaScript/TypeScript by functions."""
+        # Definition lines found with a single pass over the source
+        definitions = _find_definitions(_JS_DEF_RE, content)
+        return self._chunk_by_definitions(
+            file_path,
+            content,
+            self.detect_language(file_path),
+            definitions,
+            retype_at_start=False,
+        )
+    
+    def _chunk_by_definitions(
+        self,
+        file_path: str,
+        content: str,
+        language: str,
+        definitions: dict[int, str],
+        retype_at_start: bool = True,
+    ) -> list[Chunk]:
+        """
+        Split content into chunks at definition lines and at the size limit.
         
-        # Regex patterns for Python constructs
-        func_pattern = re.compile(r"^(\s*)(async\s+)?def\s+(\w+)")
-        class_pattern = re.compile(r"^(\s*)class\s+(\w+)")
+        Chunks are contiguous line ranges sliced out of content. Rather than
+        stepping through every line, each iteration jumps straight to the
+        next boundary: the next definition (via bisect over the sorted
+        definition lines) or the first line that pushes the chunk over the
+        size limit (via bisect over the line offsets).
+        
+        Args:
+            file_path: Path of the file being chunked
+            content: File content
+            language: Language recorded on the chunks
+            definitions: Map of 1-based definition lines to chunk types
+            retype_at_start: Whether a definition on the first line of the
+                current chunk sets the chunk type (JS keeps the old type)
+            
+        Returns:
+            List of chunks
+        """
+        chunks = []
+        offsets = _line_offsets(content)
+        num_lines = len(offsets) - 1
+        def_lines = sorted(definitions)
+        num_defs = len(def_lines)
         
-        current_chunk_lines = []
+        # A chunk's size counts a trailing newline per line, hence the +1
+        max_size = self.chunk_size * 2 + 1
         current_start = 1
-        current_indent = 0
         current_type = "module"
+        i = 1  # Next line to look at
+        d = 0  # Index of the next candidate in def_lines
         
-        for i, line in enumerate(lines, 1):
-            func_match = func_pattern.match(line)
-            class_match = class_pattern.match(line)
+        while i <= num_lines:
+            d = bisect_left(def_lines, i, d)
+            if d < num_defs and def_lines[d] == current_start and not retype_at_start:
+                d += 1
+            # Sentinel past any too_large value (at most num_lines + 1)
+            next_def = def_lines[d] if d < num_defs else num_lines + 2
             
-            # Check if this starts a new top-level definition
-            if func_match and len(func_match.group(1)) == 0:
-                # Save previous chunk if it exists
-                if current_chunk_lines:
-                    chunk_content = "\n".join(current_chunk_lines)
-                    if chunk_content.strip():
-                        chunks.append(Chunk(
-                            content=chunk_content,
-                            file_path=file_path,
-                            start_line=current_start,
-                            end_line=i - 1,
-                            language="python",
-                            chunk_type=current_type,
-                        ))
-                
-                current_chunk_lines = [line]
-                current_start = i
-                current_type = "function"
-                current_indent = 0
-                
-            elif class_match and len(class_match.group(1)) == 0:
-                # Save previous chunk
-                if current_chunk_lines:
-                    chunk_content = "\n".join(current_chunk_lines)
-                    if chunk_content.strip():
+            # First line whose end takes the chunk past max_size
+            too_large = bisect_right(offsets, offsets[current_start - 1] + max_size, i)
+            
+            if next_def <= too_large:
+                # Save previous chunk if it exists, then start the definition
+                if current_start < next_def:
+                    chunk_content = content[offsets[current_start - 1]:offsets[next_def - 1] - 1]
+                    if not _is_blank(chunk_content):
                         chunks.append(Chunk(
                             content=chunk_content,
                             file_path=file_path,
                             start_line=current_start,
-                            end_line=i - 1,
-                            language="python",
+                            end_line=next_def - 1,
+                            language=language,
                             chunk_type=current_type,
                         ))
-                
-                current_chunk_lines = [line]
-                current_start = i
-                current_type = "class"
-                current_indent = 0
-            else:
-                current_chunk_lines.append(line)
-                
-                # Check if chunk is getting too large
-                chunk_content = "\n".join(current_chunk_lines)
-                if len(chunk_content) > self.chunk_size * 2:
-                    # Split at a reasonable point
-                    chunks.append(Chunk(
-                        content=chunk_content,
-                        file_path=file_path,
-                        start_line=current_start,
-                        end_line=i,
-                        language="python",
-                        chunk_type=current_type,
-                    ))
-                    current_chunk_lines = []
-                    current_start = i + 1
-                    current_type = "code"
-        
-        # Don't forget the last chunk
-        if current_chunk_lines:
-            chunk_content = "\n".join(current_chunk_lines)
-            if chunk_content.strip():
+                current_start = next_def
+                current_type = definitions[next_def]
+                i = next_def + 1
+            elif too_large <= num_lines:
+                # Chunk is getting too large, split after this line
                 chunks.append(Chunk(
-                    content=chunk_content,
+                    content=content[offsets[current_start - 1]:offsets[too_large] - 1],
                     file_path=file_path,
                     start_line=current_start,
-                    end_line=len(lines),
-                    language="python",
+                    end_line=too_large,
+                    language=language,
                     chunk_type=current_type,
                 ))
-        
-        return chunks
-    
-    def _chunk_javascript(self, file_path: str, content: str) -> list[Chunk]:
-        """Chunk JavaScript/TypeScript by functions."""
-        chunks = []
-        lines = content.split("\n")
-        
-        # Patterns for JS/TS constructs
-        func_patterns = [
-            re.compile(r"^(export\s+)?(async\s+)?function\s+\w+"),
-            re.compile(r"^(export\s+)?const\s+\w+\s*=\s*(async\s+)?\("),
-            re.compile(r"^(export\s+)?class\s+\w+"),
-        ]
-        
-        current_chunk_lines = []
-        current_start = 1
-        current_type = "module"
-        
-        for i, line in enumerate(lines, 1):
-            is_new_definition = any(p.match(line.strip()) for p in func_patterns)
-            
-            if is_new_definition and current_chunk_lines:
-                chunk_content = "\n".join(current_chunk_lines)
-                if chunk_content.strip():
-                    chunks.append(Chunk(
-                        content=chunk_content,
-                        file_path=file_path,
-                        start_line=current_start,
-                        end_line=i - 1,
-                        language=self.detect_language(file_path),
-                        chunk_type=current_type,
-                    ))
-                current_chunk_lines = [line]
-                current_start = i
-                current_type = "function"
+                current_start = too_large + 1
+                current_type = "code"
+                i = too_large + 1
             else:
-                current_chunk_lines.append(line)
-                
-                # Check size limit
-                chunk_content = "\n".join(current_chunk_lines)
-                if len(chunk_content) > self.chunk_size * 2:
-                    chunks.append(Chunk(
-                        content=chunk_content,
-                        file_path=file_path,
-                        start_line=current_start,
-                        end_line=i,
-                        language=self.detect_language(file_path),
-                        chunk_type=current_type,
-                    ))
-                    current_chunk_lines = []
-                    current_start = i + 1
-                    current_type = "code"
+                break
         
-        # Last chunk
-        if current_chunk_lines:
-            chunk_content = "\n".join(current_chunk_lines)
-            if chunk_content.strip():
+        # Don't forget the last chunk
+        if current_start <= num_lines:
+            chunk_content = content[offsets[current_start - 1]:]
+            if not _is_blank(chunk_content):
                 chunks.append(Chunk(
                     content=chunk_content,
                     file_path=file_path,
                     start_line=current_start,
-                    end_line=len(lines),
-                    language=self.detect_language(file_path),
+                    end_line=num_lines,
+                    language=language,
                     chunk_type=current_type,
                 ))
         
@@ -292,51 +430,43 @@ class CodeChunker:
     def _chunk_markdown(self, file_path: str, content: str) -> list[Chunk]:
         """Chunk Markdown by headings."""
         chunks = []
-        lines = content.split("\n")
+        offsets = _line_offsets(content)
+        num_lines = len(offsets) - 1
         
-        heading_pattern = re.compile(r"^(#{1,6})\s+(.+)")
-        
-        current_chunk_lines = []
         current_start = 1
         current_heading = ""
         
-        for i, line in enumerate(lines, 1):
-            heading_match = heading_pattern.match(line)
+        # Sections run from one heading line to the line before the next
+        for i, heading_match in _iter_line_matches(_MD_HEADING_RE, content):
+            # Save previous section
+            if current_start < i:
+                chunk_content = content[offsets[current_start - 1]:offsets[i - 1] - 1]
+                if not _is_blank(chunk_content):
+                    chunks.append(Chunk(
+                        content=chunk_content,
+                        file_path=file_path,
+                        start_line=current_start,
+                        end_line=i - 1,
+                        language="markdown",
+                        chunk_type="section",
+                        metadata={"heading": current_heading},
+                    ))
             
-            if heading_match:
-                # Save previous section
-                if current_chunk_lines:
-                    chunk_content = "\n".join(current_chunk_lines)
-                    if chunk_content.strip():
-                        chunks.append(Chunk(
-                            content=chunk_content,
-                            file_path=file_path,
-                            start_line=current_start,
-                            end_line=i - 1,
-                            language="markdown",
-                            chunk_type="section",
-                            metadata={"heading": current_heading},
-                        ))
-                
-                current_chunk_lines = [line]
-                current_start = i
-                current_heading = heading_match.group(2)
-            else:
-                current_chunk_lines.append(line)
+            current_start = i
+            current_heading = heading_match.group(2)
         
         # Last section
-        if current_chunk_lines:
-            chunk_content = "\n".join(current_chunk_lines)
-            if chunk_content.strip():
-                chunks.append(Chunk(
-                    content=chunk_content,
-                    file_path=file_path,
-                    start_line=current_start,
-                    end_line=len(lines),
-                    language="markdown",
-                    chunk_type="section",
-                    metadata={"heading": current_heading},
-                ))
+        chunk_content = content[offsets[current_start - 1]:]
+        if not _is_blank(chunk_content):
+            chunks.append(Chunk(
+                content=chunk_content,
+                file_path=file_path,
+                start_line=current_start,
+                end_line=num_lines,
+                language="markdown",
+                chunk_type="section",
+                metadata={"heading": current_heading},
+            ))
         
         return chunks
     
@@ -348,20 +478,19 @@ class CodeChunker:
     ) -> list[Chunk]:
         """Fallback: chunk by character count with line boundaries."""
         chunks = []
-        lines = content.split("\n")
+        offsets = _line_offsets(content)
+        num_lines = len(offsets) - 1
         
-        current_chunk_lines = []
         current_start = 1
         current_size = 0
         
-        for i, line in enumerate(lines, 1):
-            line_size = len(line) + 1  # +1 for newline
+        for i in range(1, num_lines + 1):
+            line_size = offsets[i] - offsets[i - 1]  # includes newline
             
-            if current_size + line_size > self.chunk_size and current_chunk_lines:
+            if current_size + line_size > self.chunk_size and current_size:
                 # Save current chunk
-                chunk_content = "\n".join(current_chunk_lines)
                 chunks.append(Chunk(
-                    content=chunk_content,
+                    content=content[offsets[current_start - 1]:offsets[i - 1] - 1],
                     file_path=file_path,
                     start_line=current_start,
                     end_line=i - 1,
@@ -369,24 +498,23 @@ class CodeChunker:
                     chunk_type="code",
                 ))
                 
-                # Start new chunk with overlap
-                overlap_lines = current_chunk_lines[-3:] if len(current_chunk_lines) > 3 else []
-                current_chunk_lines = overlap_lines + [line]
-                current_start = max(1, i - len(overlap_lines))
-                current_size = sum(len(l) + 1 for l in current_chunk_lines)
+                # Start new chunk with the trailing lines that fit in
+                # chunk_overlap, always moving past the previous start
+                overlap_start = bisect_left(offsets, offsets[i - 1] - self.chunk_overlap) + 1
+                current_start = min(i, max(overlap_start, current_start + 1))
+                current_size = offsets[i] - offsets[current_start - 1]
             else:
-                current_chunk_lines.append(line)
                 current_size += line_size
         
         # Last chunk
-        if current_chunk_lines:
-            chunk_content = "\n".join(current_chunk_lines)
-            if chunk_content.strip():
+        if current_size:
+            chunk_content = content[offsets[current_start - 1]:]
+            if not _is_blank(chunk_content):
                 chunks.append(Chunk(
                     content=chunk_content,
                     file_path=file_path,
                     start_line=current_start,
-                    end_line=len(lines),
+                    end_line=num_lines,
                     language=language,
                     chunk_type="code",
                 ))
@@ -398,23 +526,48 @@ class CodeChunker:
         if len(chunks) <= 1:
             return chunks
         
+        contents = [chunk.content for chunk in chunks]
+        if self.tokenizer is not None:
+            # Token counts for all chunks in one batched encode
+            sizes = [len(tokens) for tokens in self.tokenizer.encode_ordinary_batch(contents)]
+            separator = 0
+        else:
+            sizes = [len(content) for content in contents]
+            separator = 1
+        
         merged = []
-        current = chunks[0]
+        # A run of chunks merged into `first`; contents are joined once when
+        # the run ends instead of re-copying the growing string per merge
+        first = last = chunks[0]
+        parts = [contents[0]]
+        size = sizes[0]
         
-        for next_chunk in chunks[1:]:
+        for i in range(1, len(chunks)):
+            next_chunk = chunks[i]
             # If current chunk is small, merge with next
-            if len(current.content) < self.min_chunk_size:
-                current = Chunk(
-                    content=current.content + "\n" + next_chunk.content,
-                    file_path=current.file_path,
-                    start_line=current.start_line,
-                    end_line=next_chunk.end_line,
-                    language=current.language,
-                    chunk_type=current.chunk_type,
-                )
+            if size < self.min_chunk_size:
+                parts.append(contents[i])
+                size += sizes[i] + separator
+                last = next_chunk
             else:
-                merged.append(current)
-                current = next_chunk
+                merged.append(_join_run(first, last, parts))
+                first = last = next_chunk
+                parts = [contents[i]]
+                size = sizes[i]
         
-        merged.append(current)
+        merged.append(_join_run(first, last, parts))
         return merged
+
+
+def _join_run(first: Chunk, last: Chunk, parts: list[str]) -> Chunk:
+    """Build the chunk for a run of merged chunks (first itself if no merge)."""
+    if first is last:
+        return first
+    return Chunk(
+        content="\n".join(parts),
+        file_path=first.file_path,
+        start_line=first.start_line,
+        end_line=last.end_line,
+        language=first.language,
+        chunk_type=first.chunk_type,
+    )
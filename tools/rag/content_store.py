@@ -0,0 +1,284 @@
+"""
+Compressed content store for RAG chunks.
+
+Chunk text is kept out of the vector database: the chunks of one file are
+compressed together into a frame appended to a single file, and the
+database only stores each chunk's (frame offset, frame length, start,
+end) reference.
+"""
+
+import fcntl
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+
+try:
+    import zstandard  # Optional: faster, better-compressing frames
+except ImportError:
+    zstandard = None
+
+
+# Each frame starts with a codec marker, so a store written with zstandard
+# available stays readable (and appendable) without it, and vice versa
+_ZSTD = b"z"
+_ZLIB = b"d"
+
+# File header: magic, base offset, dead bytes. Frame offsets are logical:
+# compaction drops the file's dead prefix and raises the base instead of
+# renumbering the frames that remain. Files without the header (written
+# before compaction existed) have base 0.
+_MAGIC = b"HCS1"
+_HEADER = struct.Struct("<4sQQ")
+_DEAD_FIELD = struct.calcsize("<4sQ")
+
+_COPY_SIZE = 1 << 20
+
+
+def _compress(data: bytes) -> bytes:
+    """Compress a frame with the best available codec."""
+    if zstandard:
+        return _ZSTD + zstandard.ZstdCompressor(level=3).compress(data)
+    return _ZLIB + zlib.compress(data, 3)
+
+
+def _decompress(frame: bytes) -> bytes:
+    """Decompress a frame written by _compress."""
+    codec, payload = frame[:1], frame[1:]
+    if codec == _ZLIB:
+        return zlib.decompress(payload)
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Content store frame needs zstandard: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    raise ValueError(f"Unknown content store codec: {codec!r}")
+
+
+class ContentStore:
+    """
+    Append-only file of compressed content frames.
+    
+    Frames are never rewritten in place, so readers only ever see complete
+    frames for the references stored in the database. Space of deleted
+    chunks is reported via mark_dead() and reclaimed by compact().
+    
+    Several instances (or processes) may share the file: every operation
+    reads the header from the file it opened, so a compaction by another
+    instance is picked up, and writers serialize on a lock file. Hold
+    locked() around an append and the database write referencing it, so a
+    concurrent compaction cannot drop the new frames in between.
+    """
+    
+    __slots__ = ("path", "_lock_path", "_thread_lock", "_lock_depth")
+    
+    def __init__(self, path: Path):
+        """
+        Initialize content store.
+        
+        Args:
+            path: File holding the frames
+        """
+        self.path = Path(path)
+        self._lock_path = self.path.with_name(self.path.name + ".lock")
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+    
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Hold the writer lock (re-entrant within this instance)."""
+        with self._thread_lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+    
+    @staticmethod
+    def _read_header(f: BinaryIO) -> tuple[int, int, int]:
+        """
+        Read the header of an open store file.
+        
+        Returns:
+            Tuple of (base offset, header size, dead bytes)
+        """
+        f.seek(0)
+        header = f.read(_HEADER.size)
+        if header[:len(_MAGIC)] == _MAGIC:
+            _, base, dead = _HEADER.unpack(header)
+            return base, _HEADER.size, dead
+        if header:
+            return 0, 0, 0  # Legacy file without header
+        return 0, _HEADER.size, 0  # Empty: the header is written on append
+    
+    def _upgrade_legacy(self) -> None:
+        """Give a file written without header one (caller holds the lock)."""
+        try:
+            src = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with src:
+            if self._read_header(src)[1] or not src.read(1):
+                return
+            # Base 0 keeps every stored offset valid
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "wb") as dst:
+                dst.write(_HEADER.pack(_MAGIC, 0, 0))
+                src.seek(0)
+                while data := src.read(_COPY_SIZE):
+                    dst.write(data)
+        os.replace(tmp_path, self.path)
+    
+    def usage(self) -> tuple[int, int]:
+        """
+        Get the space used by stored frames.
+        
+        Returns:
+            Tuple of (dead bytes, total bytes of live and dead frames)
+        """
+        try:
+            with open(self.path, "rb") as f:
+                _, header_size, dead = self._read_header(f)
+                return dead, os.fstat(f.fileno()).st_size - header_size
+        except FileNotFoundError:
+            return 0, 0
+    
+    def append(self, frames: list[bytes]) -> list[tuple[int, int]]:
+        """
+        Compress and append frames.
+        
+        Args:
+            frames: Uncompressed frame contents
+            
+        Returns:
+            (offset, length) of each stored frame
+        """
+        refs = []
+        with self.locked():
+            self._upgrade_legacy()
+            with open(self.path, "a+b") as f:
+                base, header_size, _ = self._read_header(f)
+                if f.seek(0, os.SEEK_END) == 0:
+                    f.write(_HEADER.pack(_MAGIC, 0, 0))
+                offset = f.tell() - header_size + base
+                for frame in frames:
+                    data = _compress(frame)
+                    f.write(data)
+                    refs.append((offset, len(data)))
+                    offset += len(data)
+        return refs
+    
+    def read(self, refs: list[tuple[int, int]]) -> dict[tuple[int, int], bytes]:
+        """
+        Read and decompress frames.
+        
+        Args:
+            refs: (offset, length) of each frame; duplicates are read once
+            
+        Returns:
+            Dict mapping each reference to its uncompressed frame content
+        """
+        frames: dict[tuple[int, int], bytes] = {}
+        if not refs:
+            return frames
+        
+        with open(self.path, "rb") as f:
+            base, header_size, _ = self._read_header(f)
+            shift = header_size - base
+            for offset, length in sorted(set(refs)):
+                f.seek(offset + shift)
+                frames[(offset, length)] = _decompress(f.read(length))
+        return frames
+    
+    def mark_dead(self, nbytes: int) -> None:
+        """
+        Record frames that are no longer referenced.
+        
+        Args:
+            nbytes: Total length of the dropped frames
+        """
+        if nbytes <= 0:
+            return
+        
+        with self.locked():
+            self._upgrade_legacy()
+            try:
+                f = open(self.path, "r+b")
+            except FileNotFoundError:
+                return
+            with f:
+                _, header_size, dead = self._read_header(f)
+                if not header_size or f.seek(0, os.SEEK_END) == 0:
+                    return
+                f.seek(_DEAD_FIELD)
+                f.write(struct.pack("<Q", dead + nbytes))
+    
+    def compact(
+        self,
+        refs: list[tuple[int, int]],
+        relocate: Callable[[dict[int, int]], None],
+    ) -> None:
+        """
+        Drop all frames except refs.
+        
+        The live frames are first copied to the end of the file, so old and
+        new references are both valid while relocate() updates the database,
+        and the old part of the file is only dropped afterwards (atomically).
+        An interruption at any point leaves a readable store. Hold locked()
+        while collecting refs, so no frame is appended in between.
+        
+        Args:
+            refs: (offset, length) of every frame still referenced
+            relocate: Called with {old offset: new offset} of the copied
+                frames; must point the database at the new offsets
+        """
+        live = sorted(set(refs))
+        moved: dict[int, int] = {}
+        with self.locked():
+            self._upgrade_legacy()
+            if not self.path.exists():
+                return
+            
+            with open(self.path, "r+b") as f:
+                base, header_size, _ = self._read_header(f)
+                shift = header_size - base
+                start = f.seek(0, os.SEEK_END) - shift
+                offset = start
+                for old_offset, length in live:
+                    f.seek(old_offset + shift)
+                    data = f.read(length)
+                    f.seek(0, os.SEEK_END)
+                    f.write(data)
+                    moved[old_offset] = offset
+                    offset += length
+            
+            relocate(moved)
+            
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(self.path, "rb") as src, open(tmp_path, "wb") as dst:
+                dst.write(_HEADER.pack(_MAGIC, start, 0))
+                src.seek(start + shift)
+                while data := src.read(_COPY_SIZE):
+                    dst.write(data)
+            os.replace(tmp_path, self.path)
+    
+    def clear(self) -> None:
+        """Remove all stored frames."""
+        with self.locked():
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
@@ -5,8 +5,12 @@ Generates embeddings using OpenAI's text-embedding models.
 """
 
 import asyncio
+import hashlib
+import sqlite3
+from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import tiktoken
 from openai import AsyncOpenAI
 
@@ -18,12 +22,16 @@ class EmbeddingConfig(BaseModel):
     model: str = "text-embedding-3-small"
     dimensions: int = 1536
     batch_size: int = 100
+    max_concurrency: int = 8
 
 
 class EmbeddingService:
     """
     Service for generating text embeddings via OpenAI API.
     
+    Embeddings are returned as float32 NumPy arrays: one vector of shape
+    (dimensions,) per text, or a (len(texts), dimensions) matrix for batches.
+    
     Usage:
         service = EmbeddingService()
         embedding = await service.embed_text("Hello world")
@@ -36,6 +44,8 @@ class EmbeddingService:
         dimensions: int = 1536,
         batch_size: int = 100,
         api_key: Optional[str] = None,
+        max_concurrency: int = 8,
+        cache_path: Optional[str] = None,
     ):
         """
         Initialize embedding service.
@@ -45,10 +55,13 @@ class EmbeddingService:
             dimensions: Output embedding dimensions
             batch_size: Maximum texts per API call
         api_key: Optional API key (uses GlobalConfig or OPENAI_API_KEY env var if not provided)
+            max_concurrency: Maximum batch requests in flight at once
+            cache_path: Optional SQLite file for caching embeddings by content
         """
         self.model = model
         self.dimensions = dimensions
         self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
         
         # Try to resolve API key: Argument -> GlobalConfig -> Env Var (handled by GlobalConfigManager)
         if not api_key:
@@ -67,6 +80,49 @@ class EmbeddingService:
         
         # Max tokens for embedding models
         self.max_tokens = 8191
+        
+        # Optional content-addressed embedding cache
+        self._cache: Optional[sqlite3.Connection] = None
+        if cache_path:
+            self._cache = self._open_cache(cache_path)
+    
+    def _open_cache(self, cache_path: str) -> sqlite3.Connection:
+        """Open (and create if needed) the embedding cache database."""
+        Path(cache_path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(cache_path)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (hash BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+        )
+        return conn
+    
+    def _cache_key(self, text: str) -> bytes:
+        """Hash text together with the model settings that shape its vector."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{self.model}:{self.dimensions}:".encode())
+        h.update(text.encode("utf-8", errors="surrogatepass"))
+        return h.digest()
+    
+    def _cache_get(self, keys: list[bytes]) -> dict[bytes, np.ndarray]:
+        """Fetch cached vectors for the given keys."""
+        hits = {}
+        # Stay well below SQLite's host parameter limit
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self._cache.execute(
+                f"SELECT hash, vec FROM cache WHERE hash IN ({placeholders})", part
+            )
+            for key, blob in rows:
+                hits[key] = np.frombuffer(blob, dtype=np.float32)
+        return hits
+    
+    def _cache_put(self, items: dict[bytes, np.ndarray]) -> None:
+        """Store vectors in the cache."""
+        self._cache.executemany(
+            "INSERT OR REPLACE INTO cache (hash, vec) VALUES (?, ?)",
+            ((key, vec.tobytes()) for key, vec in items.items()),
+        )
+        self._cache.commit()
     
     def count_tokens(self, text: str) -> int:
         """Count tokens in text."""
@@ -92,7 +148,7 @@ class EmbeddingService:
         truncated_tokens = tokens[:max_tokens]
         return self.tokenizer.decode(truncated_tokens)
     
-    async def embed_text(self, text: str) -> list[float]:
+    async def embed_text(self, text: str) -> np.ndarray:
         """
         Generate embedding for a single text.
         
@@ -100,7 +156,7 @@ class EmbeddingService:
             text: Text to embed
             
         Returns:
-            Embedding vector as list of floats
+            Embedding vector as a float32 array
         """
         # Truncate if too long
         text = self.truncate_text(text)
@@ -111,13 +167,13 @@ class EmbeddingService:
             dimensions=self.dimensions,
         )
         
-        return response.data[0].embedding
+        return np.asarray(response.data[0].embedding, dtype=np.float32)
     
     async def embed_batch(
         self,
         texts: list[str],
         show_progress: bool = False,
-    ) -> list[list[float]]:
+    ) -> np.ndarray:
         """
         Generate embeddings for multiple texts.
         
@@ -126,45 +182,85 @@ class EmbeddingService:
             show_progress: Whether to print progress
             
         Returns:
-            List of embedding vectors
+            Float32 array of shape (len(texts), dimensions)
         """
         if not texts:
-            return []
+            return np.empty((0, self.dimensions), dtype=np.float32)
         
-        # Truncate all texts
-        texts = [self.truncate_text(t) for t in texts]
+        # Truncate all texts: tokenize in one batched call and only
+        # decode the ones that are actually over the limit
+        token_lists = self.tokenizer.encode_ordinary_batch(texts)
+        texts = [
+            self.tokenizer.decode(tokens[:self.max_tokens])
+            if len(tokens) > self.max_tokens else text
+            for text, tokens in zip(texts, token_lists)
+        ]
         
-        all_embeddings = []
+        if self._cache is None:
+            return await self._embed_uncached(texts, show_progress)
         
-        # Process in batches
-        for i in range(0, len(texts), self.batch_size):
-            batch = texts[i:i + self.batch_size]
-            
-            if show_progress:
-                print(f"  Embedding batch {i // self.batch_size + 1}/{(len(texts) - 1) // self.batch_size + 1}")
+        # Only texts not seen before (for this model/dimensions) hit the API
+        keys = [self._cache_key(t) for t in texts]
+        vectors = self._cache_get(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        
+        if missing:
+            new_vectors = await self._embed_uncached(list(missing.values()), show_progress)
+            fresh = dict(zip(missing, new_vectors))
+            self._cache_put(fresh)
+            vectors.update(fresh)
+        
+        result = np.empty((len(keys), self.dimensions), dtype=np.float32)
+        for i, key in enumerate(keys):
+            result[i] = vectors[key]
+        return result
+    
+    async def _embed_uncached(
+        self,
+        texts: list[str],
+        show_progress: bool = False,
+    ) -> np.ndarray:
+        """Embed already-truncated texts via the API, in concurrent batches."""
+        num_batches = (len(texts) - 1) // self.batch_size + 1
+        
+        # Batches run concurrently; the semaphore caps requests in flight
+        # and the client's built-in retry/backoff handles rate limiting
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        # Each batch writes its rows straight into one contiguous matrix
+        result = np.empty((len(texts), self.dimensions), dtype=np.float32)
+        
+        async def embed_one(batch_index: int) -> None:
+            start = batch_index * self.batch_size
+            batch = texts[start:start + self.batch_size]
             
-            response = await self.client.embeddings.create(
-                model=self.model,
-                input=batch,
-                dimensions=self.dimensions,
-            )
+            async with semaphore:
+                if show_progress:
+                    print(f"  Embedding batch {batch_index + 1}/{num_batches}")
+                
+                response = await self.client.embeddings.create(
+                    model=self.model,
+                    input=batch,
+                    dimensions=self.dimensions,
+                )
             
             # Extract embeddings in order
-            batch_embeddings = [item.embedding for item in response.data]
-            all_embeddings.extend(batch_embeddings)
-            
-            # Small delay to avoid rate limits
-            if i + self.batch_size < len(texts):
-                await asyncio.sleep(0.1)
+            for offset, item in enumerate(response.data):
+                result[start + offset] = item.embedding
+        
+        await asyncio.gather(*(embed_one(b) for b in range(num_batches)))
         
-        return all_embeddings
+        return result
     
     async def embed_with_retry(
         self,
         text: str,
         max_retries: int = 3,
         delay: float = 1.0,
-    ) -> list[float]:
+    ) -> np.ndarray:
         """
         Generate embedding with retry logic.
         
@@ -4,16 +4,38 @@ Codebase Indexer for RAG.
 Manages indexing of code files into the vector database.
 """
 
+import asyncio
 import hashlib
 import json
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Callable, Optional
 
+import numpy as np
+
 from .chunker import CodeChunker, Chunk
 from .embeddings import EmbeddingService
 from .vectordb import VectorDB
 
+try:
+    import xxhash  # Optional: SIMD-accelerated fingerprints
+except ImportError:
+    xxhash = None
+
+try:
+    import orjson  # Optional: faster metadata (de)serialization
+except ImportError:
+    orjson = None
+
+# Recorded in index metadata so fingerprints from another algorithm are
+# treated as stale instead of silently never matching
+HASH_ALGO = "xxh3_64" if xxhash else "blake2b-128"
+
 
 # Default file extensions to index
 DEFAULT_EXTENSIONS = {
@@ -30,6 +52,209 @@ DEFAULT_EXCLUDE_DIRS = {
     "egg-info", ".eggs",
 }
 
+# Ingestion pipeline: files chunked ahead of the embedder, chunks buffered
+# across files before embedding, and chunks per embed_batch call (bins of
+# similar length, so no request is dominated by one long outlier)
+PIPELINE_QUEUE_SIZE = 8
+EMBED_BATCH_CHUNKS = 512
+EMBED_BIN_SIZE = 64
+# Chunks per vector DB upsert, independent of the embedding batch size
+UPSERT_BATCH_CHUNKS = 2048
+# Files read and chunked concurrently in worker threads
+CHUNK_PREFETCH = 4
+
+
+def _hash_path(file_path: Path) -> str:
+    """
+    Hash a file's content for change detection.
+    
+    Reads in 1 MiB blocks so large files are never held in memory whole.
+    """
+    h = xxhash.xxh3_64() if xxhash else hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _hash_paths(file_paths: list[Path]) -> dict[Path, str]:
+    """
+    Hash many files concurrently.
+    
+    hashlib releases the GIL while hashing and file reads block on I/O,
+    so threads scale with cores here. Files that cannot be read are left
+    out of the result.
+    """
+    def hash_or_none(file_path: Path) -> Optional[str]:
+        try:
+            return _hash_path(file_path)
+        except OSError:
+            return None
+    
+    if len(file_paths) <= 1:
+        hashes = map(hash_or_none, file_paths)
+    else:
+        workers = min(len(file_paths), (os.cpu_count() or 1) * 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            hashes = list(executor.map(hash_or_none, file_paths))
+    
+    return {
+        file_path: file_hash
+        for file_path, file_hash in zip(file_paths, hashes)
+        if file_hash is not None
+    }
+
+
+# A .gitignore line that only matches on the file extension
+_IGNORE_EXT_RE = re.compile(r"\*\.[A-Za-z0-9_-]+")
+
+
+def _gitignore_regex(pattern: str) -> str:
+    """
+    Translate one .gitignore pattern into a regex over relative POSIX paths.
+    
+    The regex matches a path if the pattern matches the path itself or one
+    of its parent directories. Supports anchoring, directory-only patterns,
+    *, ?, [...] and **.
+    """
+    dir_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    # A slash anywhere but the end anchors the pattern to the root
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            parts.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i) and i + 2 == n and (i == 0 or pattern[i - 1] == "/"):
+            parts.append(".*")
+            i += 2
+        elif c == "*":
+            parts.append("[^/]*")
+            i += 1
+        elif c == "?":
+            parts.append("[^/]")
+            i += 1
+        elif c == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body[0] == "!":
+                body = "^" + body[1:]
+            parts.append("[" + body.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            parts.append(re.escape(c))
+            i += 1
+    
+    prefix = "" if anchored else "(?:.*/)?"
+    suffix = "/" if dir_only else "(?:/|$)"
+    return prefix + "".join(parts) + suffix
+
+
+def _compile_gitignore(lines: list[str]) -> tuple[Optional[re.Pattern], tuple[bool, ...]]:
+    """
+    Compile .gitignore lines into one regex plus per-group decisions.
+    
+    Consecutive patterns of the same kind form one capturing group, and
+    groups are ordered last rule first. The first group that matches
+    decides, so m.lastindex indexes into the decisions (True = ignore) and
+    checking a path is a single regex match with no Python-level loop.
+    """
+    rules: list[tuple[list[str], bool]] = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        ignore = not line.startswith("!")
+        if not ignore:
+            line = line[1:]
+        if line.rstrip("/") in ("", "**"):
+            continue
+        if rules and rules[-1][1] == ignore:
+            rules[-1][0].append(_gitignore_regex(line))
+        else:
+            rules.append(([_gitignore_regex(line)], ignore))
+    
+    if not rules:
+        return None, ()
+    
+    rules.reverse()
+    regex = re.compile("|".join(
+        "(" + "|".join(f"(?:{r})" for r in regexes) + ")"
+        for regexes, _ in rules
+    ))
+    return regex, tuple(ignore for _, ignore in rules)
+
+
+def _ignored_extensions(lines: list[str]) -> frozenset[str]:
+    """
+    Collect the suffixes of simple "*.ext" .gitignore patterns.
+    
+    Only patterns after the last negation are safe to short-circuit: a
+    file matching one is ignored no matter what follows. The patterns stay
+    in the compiled regex too (they also match directories).
+    """
+    extensions: set[str] = set()
+    for line in lines:
+        line = line.strip()
+        if line.startswith("!"):
+            extensions.clear()
+        elif _IGNORE_EXT_RE.fullmatch(line):
+            extensions.add(line[1:])
+    return frozenset(extensions)
+
+
+def _make_path_filters(
+    extensions: frozenset[str],
+    exclude_dirs: frozenset[str],
+    ignore_exts: frozenset[str],
+    ignore_regex: Optional[re.Pattern],
+    ignore_decisions: tuple[bool, ...],
+) -> tuple[Callable[[str, str], bool], Callable[[str, str], bool]]:
+    """
+    Build the walker's (accept_file, accept_dir) checks.
+    
+    The filter state is bound into closures once, so the per-entry checks
+    do no attribute lookups, and a workspace without .gitignore rules gets
+    variants that skip the regex entirely. Both take the entry name and
+    its workspace-relative POSIX path (with a trailing "/" for dirs).
+    """
+    splitext = os.path.splitext
+    
+    if ignore_regex is None:
+        def accept_file(name: str, relative_path: str) -> bool:
+            return splitext(name)[1].lower() in extensions
+        
+        def accept_dir(name: str, relative_path: str) -> bool:
+            return name not in exclude_dirs
+        
+        return accept_file, accept_dir
+    
+    match = ignore_regex.match
+    
+    def accept_file(name: str, relative_path: str) -> bool:
+        suffix = splitext(name)[1]
+        if suffix.lower() not in extensions or suffix in ignore_exts:
+            return False
+        m = match(relative_path)
+        return m is None or not ignore_decisions[m.lastindex - 1]
+    
+    def accept_dir(name: str, relative_path: str) -> bool:
+        if name in exclude_dirs:
+            return False
+        m = match(relative_path)
+        return m is None or not ignore_decisions[m.lastindex - 1]
+    
+    return accept_file, accept_dir
+
 
 class CodebaseIndexer:
     """
@@ -50,6 +275,7 @@ class CodebaseIndexer:
         chunker: Optional[CodeChunker] = None,
         extensions: Optional[set[str]] = None,
         exclude_dirs: Optional[set[str]] = None,
+        embed_concurrency: int = 16,
     ):
         """
         Initialize indexer.
@@ -61,6 +287,7 @@ class CodebaseIndexer:
             chunker: Code chunker instance
             extensions: File extensions to index
             exclude_dirs: Directories to exclude
+            embed_concurrency: Maximum embed_batch calls in flight at once
         """
         self.workspace_path = Path(workspace_path).resolve()
         self.embedding_service = embedding_service  # Don't auto-create - may not be needed
@@ -70,71 +297,180 @@ class CodebaseIndexer:
         self.chunker = chunker or CodeChunker()
         self.extensions = extensions or DEFAULT_EXTENSIONS
         self.exclude_dirs = exclude_dirs or DEFAULT_EXCLUDE_DIRS
+        self.embed_concurrency = embed_concurrency
         
-        # Metadata file path
+        # Filters prepared once instead of per file
+        self._extensions = frozenset(ext.lower() for ext in self.extensions)
+        self._exclude_dirs = frozenset(self.exclude_dirs)
+        gitignore_path = self.workspace_path / ".gitignore"
+        gitignore = gitignore_path.read_text().splitlines() if gitignore_path.is_file() else []
+        self._ignore_regex, self._ignore_decisions = _compile_gitignore(gitignore)
+        self._ignore_exts = _ignored_extensions(gitignore)
+        self._accept_file, self._accept_dir = _make_path_filters(
+            self._extensions,
+            self._exclude_dirs,
+            self._ignore_exts,
+            self._ignore_regex,
+            self._ignore_decisions,
+        )
+        
+        # Metadata file path, and the parsed metadata with the (mtime_ns,
+        # size) of the file it was read from or written to
         self.meta_file = self.workspace_path / ".hive" / "index_meta.json"
+        self._meta_cache: Optional[dict] = None
+        self._meta_cache_stat: Optional[tuple[int, int]] = None
     
     def _get_file_hash(self, file_path: Path) -> str:
         """Calculate hash of file content."""
-        content = file_path.read_bytes()
-        return hashlib.md5(content).hexdigest()
+        return _hash_path(file_path)
     
     def _should_index_file(self, file_path: Path) -> bool:
         """Check if file should be indexed."""
-        # Check extension
-        if file_path.suffix.lower() not in self.extensions:
-            return False
-        
         # Check excluded directories
-        for part in file_path.parts:
-            if part in self.exclude_dirs:
-                return False
-        
-        # Check .gitignore (basic implementation)
-        gitignore_path = self.workspace_path / ".gitignore"
-        if gitignore_path.exists():
-            relative_path = str(file_path.relative_to(self.workspace_path))
-            gitignore_patterns = gitignore_path.read_text().splitlines()
-            
-            for pattern in gitignore_patterns:
-                pattern = pattern.strip()
-                if not pattern or pattern.startswith("#"):
-                    continue
-                
-                # Simple pattern matching
-                if pattern.endswith("/"):
-                    # Directory pattern
-                    if any(part == pattern[:-1] for part in file_path.parts):
-                        return False
-                elif pattern in relative_path:
-                    return False
+        relative = file_path.relative_to(self.workspace_path)
+        if not self._exclude_dirs.isdisjoint(relative.parts):
+            return False
         
-        return True
+        # Check extension and .gitignore
+        return self._accept_file(file_path.name, relative.as_posix())
     
     def _collect_files(self) -> list[Path]:
         """Collect all files to index."""
-        files = []
-        
-        for file_path in self.workspace_path.rglob("*"):
-            if file_path.is_file() and self._should_index_file(file_path):
-                files.append(file_path)
+        return [Path(entry.path) for entry in self._walk()]
+    
+    def _collect_file_stats(self) -> dict[Path, tuple[int, int]]:
+        """Collect all files to index with their (size, mtime_ns)."""
+        stats = {}
+        for entry in self._walk():
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            stats[Path(entry.path)] = (st.st_size, st.st_mtime_ns)
+        return stats
+    
+    def _walk(self):
+        """
+        Yield directory entries of indexable files under the workspace.
         
-        return files
+        Walks with os.scandir, whose entries carry cached type information,
+        and prunes excluded and gitignored directories before descending
+        into them. Symlinks (to files or directories) are skipped, so
+        nothing outside the workspace is indexed and no file twice.
+        """
+        accept_file, accept_dir = self._accept_file, self._accept_dir
+        # Directories to visit, with their workspace-relative POSIX prefix
+        stack = [(str(self.workspace_path), "")]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            
+            for entry in entries:
+                relative_path = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if accept_dir(entry.name, relative_path + "/"):
+                            stack.append((entry.path, relative_path + "/"))
+                    elif entry.is_file(follow_symlinks=False):
+                        if accept_file(entry.name, relative_path):
+                            yield entry
+                except OSError:
+                    continue
     
-    def _load_metadata(self) -> dict:
-        """Load index metadata."""
-        if self.meta_file.exists():
-            return json.loads(self.meta_file.read_text())
+    def _meta_file_stat(self) -> Optional[tuple[int, int]]:
+        """Get (mtime_ns, size) of the metadata file, or None if missing."""
+        try:
+            st = self.meta_file.stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+    
+    @staticmethod
+    def _copy_metadata(metadata: dict) -> dict:
+        """Copy metadata deep enough that callers' edits don't leak into it."""
         return {
-            "last_indexed": None,
-            "file_hashes": {},
-            "total_chunks": 0,
+            **metadata,
+            "file_hashes": dict(metadata["file_hashes"]),
+            "file_stats": dict(metadata["file_stats"]),
         }
     
+    def _load_metadata(self) -> dict:
+        """
+        Load index metadata.
+        
+        The parsed metadata is cached and only re-read when the file changes
+        on disk. Callers get a copy, so the cache only changes when metadata
+        is saved.
+        """
+        stat = self._meta_file_stat()
+        if self._meta_cache is not None and stat == self._meta_cache_stat:
+            return self._copy_metadata(self._meta_cache)
+        
+        if stat is not None:
+            data = self.meta_file.read_bytes()
+            metadata = orjson.loads(data) if orjson else json.loads(data)
+            if metadata.get("hash_algo") != HASH_ALGO:
+                # Keep the file list (for deletions) but force re-hashing
+                metadata["file_hashes"] = dict.fromkeys(metadata.get("file_hashes", {}), "")
+                metadata["file_stats"] = {}
+                metadata["hash_algo"] = HASH_ALGO
+            metadata.setdefault("file_stats", {})
+        else:
+            metadata = {
+                "last_indexed": None,
+                "hash_algo": HASH_ALGO,
+                "file_hashes": {},
+                "file_stats": {},
+                "total_chunks": 0,
+            }
+        
+        self._meta_cache = metadata
+        self._meta_cache_stat = stat
+        return self._copy_metadata(metadata)
+    
     def _save_metadata(self, metadata: dict) -> None:
-        """Save index metadata."""
+        """Save index metadata (atomically, so a crash never leaves half a file)."""
         self.meta_file.parent.mkdir(parents=True, exist_ok=True)
-        self.meta_file.write_text(json.dumps(metadata, indent=2))
+        if orjson:
+            data = orjson.dumps(metadata, option=orjson.OPT_INDENT_2)
+        else:
+            data = json.dumps(metadata, indent=2).encode()
+        tmp_file = self.meta_file.with_suffix(".json.tmp")
+        tmp_file.write_bytes(data)
+        os.replace(tmp_file, self.meta_file)
+        
+        self._meta_cache = self._copy_metadata(metadata)
+        self._meta_cache_stat = self._meta_file_stat()
+    
+    def _invalidate_meta(self) -> None:
+        """Drop cached metadata so the next load reads the file."""
+        self._meta_cache = None
+        self._meta_cache_stat = None
+    
+    def _record_file_stats(
+        self,
+        metadata: dict,
+        file_stats: dict[Path, tuple[int, int]],
+        current_hashes: dict[Path, str],
+    ) -> None:
+        """
+        Remember (size, mtime_ns) of files whose stored hash is up to date.
+        
+        Files that failed to index keep no stats, so the next incremental
+        run hashes (and retries) them.
+        """
+        file_hashes = metadata["file_hashes"]
+        stored_stats = metadata["file_stats"]
+        for file_path, stat in file_stats.items():
+            relative_path = str(file_path.relative_to(self.workspace_path))
+            current_hash = current_hashes.get(file_path)
+            if current_hash is not None and file_hashes.get(relative_path) == current_hash:
+                stored_stats[relative_path] = list(stat)
+            else:
+                stored_stats.pop(relative_path, None)
     
     def needs_reindex(self, file_path: Path) -> bool:
         """Check if file needs re-indexing."""
@@ -150,7 +486,9 @@ class CodebaseIndexer:
     def _ensure_embedding_service(self) -> None:
         """Ensure embedding service is available for indexing."""
         if self.embedding_service is None:
-            self.embedding_service = EmbeddingService()
+            self.embedding_service = EmbeddingService(
+                cache_path=str(self.workspace_path / ".hive" / "embedding_cache.db")
+            )
     
     async def index_full(
         self,
@@ -170,43 +508,34 @@ class CodebaseIndexer:
         # Clear existing index
         self.vectordb.clear()
         
-        files = self._collect_files()
+        scanned_at_ns = time.time_ns()
+        file_stats = self._collect_file_stats()
+        files = list(file_stats)
         total_files = len(files)
         total_chunks = 0
         file_hashes = {}
+        current_hashes = _hash_paths(files)
         
         print(f"Indexing {total_files} files...")
         
-        for i, file_path in enumerate(files):
-            if progress_callback:
-                progress_callback(str(file_path), i + 1, total_files)
-            
-            try:
-                # Chunk the file
-                chunks = self.chunker.chunk_file(str(file_path))
-                
-                if chunks:
-                    # Generate embeddings
-                    texts = [chunk.content for chunk in chunks]
-                    embeddings = await self.embedding_service.embed_batch(texts)
-                    
-                    # Store in vector DB
-                    self.vectordb.add_chunks(chunks, embeddings)
-                    total_chunks += len(chunks)
-                
-                # Record file hash
-                relative_path = str(file_path.relative_to(self.workspace_path))
-                file_hashes[relative_path] = self._get_file_hash(file_path)
-                
-            except Exception as e:
-                print(f"  Warning: Failed to index {file_path}: {e}")
+        indexed = await self._index_pipeline(files, progress_callback)
+        await asyncio.to_thread(self.vectordb.flush)
+        for file_path, chunk_count in indexed.items():
+            relative_path = str(file_path.relative_to(self.workspace_path))
+            if file_path in current_hashes:
+                file_hashes[relative_path] = current_hashes[file_path]
+            total_chunks += chunk_count
         
         # Save metadata
         metadata = {
             "last_indexed": datetime.now().isoformat(),
+            "hash_algo": HASH_ALGO,
             "file_hashes": file_hashes,
+            "file_stats": {},
+            "scanned_at_ns": scanned_at_ns,
             "total_chunks": total_chunks,
         }
+        self._record_file_stats(metadata, file_stats, current_hashes)
         self._save_metadata(metadata)
         
         print(f"Indexed {total_chunks} chunks from {total_files} files")
@@ -217,6 +546,182 @@ class CodebaseIndexer:
             "last_indexed": metadata["last_indexed"],
         }
     
+    async def _index_pipeline(
+        self,
+        files: list[Path],
+        progress_callback: Optional[Callable[[str, int, int], None]] = None,
+    ) -> dict[Path, int]:
+        """
+        Chunk, embed and store files as an overlapping three-stage pipeline.
+        
+        A chunker task feeds an embedder task, which feeds a writer task,
+        through bounded queues; so chunking, embedding requests and vector
+        DB writes all proceed at the same time. The chunker works a few files
+        ahead in threads; the embedder batches chunks across files and keeps
+        up to embed_concurrency requests in flight. A failure is reported
+        and skips only the affected file (chunking) or batch of files
+        (embedding/storing).
+        
+        Args:
+            files: Files to index
+            progress_callback: Optional callback(file_path, current, total)
+            
+        Returns:
+            Dict mapping each successfully indexed file to its chunk count
+        """
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        indexed: dict[Path, int] = {}
+        total_files = len(files)
+        semaphore = asyncio.Semaphore(self.embed_concurrency)
+        
+        async def chunk_stage() -> None:
+            # Files being chunked in threads, consumed in order
+            ahead: deque[tuple[Path, asyncio.Future]] = deque()
+            done = 0
+            
+            async def emit() -> None:
+                nonlocal done
+                file_path, future = ahead.popleft()
+                done += 1
+                if progress_callback:
+                    progress_callback(str(file_path), done, total_files)
+                try:
+                    chunks = await future
+                except Exception as e:
+                    print(f"  Warning: Failed to index {file_path}: {e}")
+                    return
+                await chunk_queue.put((file_path, chunks))
+            
+            try:
+                for file_path in files:
+                    ahead.append((file_path, asyncio.ensure_future(
+                        asyncio.to_thread(self.chunker.chunk_file, str(file_path))
+                    )))
+                    if len(ahead) >= CHUNK_PREFETCH:
+                        await emit()
+                while ahead:
+                    await emit()
+            finally:
+                for _, future in ahead:
+                    future.cancel()
+            await chunk_queue.put(None)
+        
+        async def embed_stage() -> None:
+            batch_files: list[tuple[Path, list[Chunk]]] = []
+            batch_chunks: list[Chunk] = []
+            pending: set[asyncio.Task] = set()
+            
+            async def embed(file_chunks: list, chunks: list[Chunk]) -> None:
+                try:
+                    embeddings = await self._embed_sorted(chunks, semaphore)
+                except Exception as e:
+                    for file_path, _ in file_chunks:
+                        print(f"  Warning: Failed to index {file_path}: {e}")
+                else:
+                    await write_queue.put((file_chunks, chunks, embeddings))
+            
+            async def flush() -> None:
+                nonlocal batch_files, batch_chunks, pending
+                # Embed in the background; results reach the writer in
+                # completion order. Cap how many buffers wait on the API.
+                pending.add(asyncio.ensure_future(embed(batch_files, batch_chunks)))
+                batch_files, batch_chunks = [], []
+                if len(pending) >= PIPELINE_QUEUE_SIZE:
+                    _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            
+            try:
+                while (item := await chunk_queue.get()) is not None:
+                    batch_files.append(item)
+                    batch_chunks.extend(item[1])
+                    if len(batch_chunks) >= EMBED_BATCH_CHUNKS:
+                        await flush()
+                if batch_files:
+                    await flush()
+                if pending:
+                    await asyncio.wait(pending)
+            finally:
+                for task in pending:
+                    task.cancel()
+            await write_queue.put(None)
+        
+        async def write_stage() -> None:
+            # Embedded batches are buffered into larger upserts
+            buffered: list[tuple[list, list[Chunk], np.ndarray]] = []
+            buffered_chunks = 0
+            
+            async def flush() -> None:
+                try:
+                    await asyncio.to_thread(
+                        self.vectordb.add_chunks_stream,
+                        [(chunks, embeddings) for _, chunks, embeddings in buffered],
+                        UPSERT_BATCH_CHUNKS,
+                    )
+                except Exception as e:
+                    for file_chunks, _, _ in buffered:
+                        for file_path, _ in file_chunks:
+                            print(f"  Warning: Failed to index {file_path}: {e}")
+                else:
+                    for file_chunks, _, _ in buffered:
+                        for file_path, chunks in file_chunks:
+                            indexed[file_path] = len(chunks)
+                buffered.clear()
+            
+            while (item := await write_queue.get()) is not None:
+                buffered.append(item)
+                buffered_chunks += len(item[1])
+                if buffered_chunks >= UPSERT_BATCH_CHUNKS:
+                    await flush()
+                    buffered_chunks = 0
+            if buffered:
+                await flush()
+        
+        tasks = [
+            asyncio.ensure_future(stage())
+            for stage in (chunk_stage, embed_stage, write_stage)
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # If one stage dies unexpectedly, don't leave the others waiting
+            for task in tasks:
+                task.cancel()
+        return indexed
+    
+    async def _embed_sorted(
+        self,
+        chunks: list[Chunk],
+        semaphore: asyncio.Semaphore,
+    ) -> np.ndarray:
+        """
+        Embed chunks in length-sorted bins sent concurrently.
+        
+        Args:
+            chunks: Chunks to embed
+            semaphore: Limits embed_batch calls in flight across callers
+            
+        Returns:
+            Embeddings in the original chunk order
+        """
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        
+        order = sorted(range(len(chunks)), key=lambda i: len(chunks[i].content))
+        bins = [order[i:i + EMBED_BIN_SIZE] for i in range(0, len(order), EMBED_BIN_SIZE)]
+        
+        async def embed_bin(indices: list[int]) -> np.ndarray:
+            async with semaphore:
+                return await self.embedding_service.embed_batch(
+                    [chunks[i].content for i in indices]
+                )
+        
+        results = await asyncio.gather(*(embed_bin(indices) for indices in bins))
+        
+        # Undo the sort
+        embeddings = np.empty((len(chunks), results[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(results)
+        return embeddings
+    
     async def index_file(self, file_path: str) -> int:
         """
         Index a single file.
@@ -234,20 +739,23 @@ class CodebaseIndexer:
             path = self.workspace_path / path
         
         # Remove old chunks for this file
-        self.vectordb.delete_by_file(str(path))
+        await asyncio.to_thread(self.vectordb.delete_by_file, str(path))
         
-        # Chunk and index
-        chunks = self.chunker.chunk_file(str(path))
+        # Chunk and index (blocking work off the event loop)
+        chunks = await asyncio.to_thread(self.chunker.chunk_file, str(path))
         
         if chunks:
             texts = [chunk.content for chunk in chunks]
             embeddings = await self.embedding_service.embed_batch(texts)
-            self.vectordb.add_chunks(chunks, embeddings)
+            await asyncio.to_thread(self.vectordb.add_chunks, chunks, embeddings)
+        await asyncio.to_thread(self.vectordb.flush)
         
         # Update metadata
         metadata = self._load_metadata()
         relative_path = str(path.relative_to(self.workspace_path))
-        metadata["file_hashes"][relative_path] = self._get_file_hash(path)
+        metadata["file_hashes"][relative_path] = await asyncio.to_thread(self._get_file_hash, path)
+        # No stat taken here; the next incremental scan re-hashes the file
+        metadata["file_stats"].pop(relative_path, None)
         metadata["total_chunks"] = self.vectordb.get_stats()["total_chunks"]
         self._save_metadata(metadata)
         
@@ -269,13 +777,36 @@ class CodebaseIndexer:
         self._ensure_embedding_service()
         
         metadata = self._load_metadata()
-        files = self._collect_files()
+        scanned_at_ns = time.time_ns()
+        file_stats = self._collect_file_stats()
+        files = list(file_stats)
+        
+        # Only read and hash files whose size or mtime changed since the
+        # last scan. Like git's "racily clean" entries, a file modified no
+        # earlier than that scan started may have changed unnoticed within
+        # the same mtime tick, so it is hashed too.
+        stored_hashes = metadata["file_hashes"]
+        stored_stats = metadata["file_stats"]
+        last_scan_ns = metadata.get("scanned_at_ns", 0)
+        current_hashes = {}
+        to_hash = []
+        for file_path, stat in file_stats.items():
+            relative_path = str(file_path.relative_to(self.workspace_path))
+            if (
+                stat[1] < last_scan_ns
+                and stored_stats.get(relative_path) == list(stat)
+                and stored_hashes.get(relative_path)
+            ):
+                current_hashes[file_path] = stored_hashes[relative_path]
+            else:
+                to_hash.append(file_path)
+        current_hashes.update(_hash_paths(to_hash))
         
         # Find changed files
         changed_files = []
         for file_path in files:
             relative_path = str(file_path.relative_to(self.workspace_path))
-            current_hash = self._get_file_hash(file_path)
+            current_hash = current_hashes.get(file_path)
             
             if relative_path not in metadata["file_hashes"]:
                 changed_files.append(file_path)
@@ -289,10 +820,14 @@ class CodebaseIndexer:
             if not full_path.exists():
                 deleted_files.append(relative_path)
         
-        # Remove deleted files from index
+        # Remove chunks of deleted and changed files in one batch
+        self.vectordb.delete_by_files(
+            [str(self.workspace_path / relative_path) for relative_path in deleted_files]
+            + [str(file_path) for file_path in changed_files]
+        )
         for relative_path in deleted_files:
-            self.vectordb.delete_by_file(str(self.workspace_path / relative_path))
             del metadata["file_hashes"][relative_path]
+            stored_stats.pop(relative_path, None)
         
         # Index changed files
         total_chunks = 0
@@ -301,31 +836,17 @@ class CodebaseIndexer:
         if total_files > 0:
             print(f"Indexing {total_files} changed files...")
         
-        for i, file_path in enumerate(changed_files):
-            if progress_callback:
-                progress_callback(str(file_path), i + 1, total_files)
-            
-            try:
-                # Remove old chunks
-                self.vectordb.delete_by_file(str(file_path))
-                
-                # Chunk and index
-                chunks = self.chunker.chunk_file(str(file_path))
-                
-                if chunks:
-                    texts = [chunk.content for chunk in chunks]
-                    embeddings = await self.embedding_service.embed_batch(texts)
-                    self.vectordb.add_chunks(chunks, embeddings)
-                    total_chunks += len(chunks)
-                
-                # Update hash
-                relative_path = str(file_path.relative_to(self.workspace_path))
-                metadata["file_hashes"][relative_path] = self._get_file_hash(file_path)
-                
-            except Exception as e:
-                print(f"  Warning: Failed to index {file_path}: {e}")
+        indexed = await self._index_pipeline(changed_files, progress_callback)
+        await asyncio.to_thread(self.vectordb.flush)
+        for file_path, chunk_count in indexed.items():
+            relative_path = str(file_path.relative_to(self.workspace_path))
+            if file_path in current_hashes:
+                metadata["file_hashes"][relative_path] = current_hashes[file_path]
+            total_chunks += chunk_count
         
         # Update metadata
+        self._record_file_stats(metadata, file_stats, current_hashes)
+        metadata["scanned_at_ns"] = scanned_at_ns
         metadata["last_indexed"] = datetime.now().isoformat()
         metadata["total_chunks"] = self.vectordb.get_stats()["total_chunks"]
         self._save_metadata(metadata)
@@ -352,12 +873,14 @@ class CodebaseIndexer:
             path = self.workspace_path / path
         
         count = self.vectordb.delete_by_file(str(path))
+        self.vectordb.flush()
         
         # Update metadata
         metadata = self._load_metadata()
         relative_path = str(path.relative_to(self.workspace_path))
         if relative_path in metadata["file_hashes"]:
             del metadata["file_hashes"][relative_path]
+            metadata["file_stats"].pop(relative_path, None)
             metadata["total_chunks"] = self.vectordb.get_stats()["total_chunks"]
             self._save_metadata(metadata)
         
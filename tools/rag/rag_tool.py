@@ -4,7 +4,11 @@ RAG Search Tool for Hive Agents.
 Provides semantic search capability over the codebase.
 """
 
-from typing import Any, Optional
+import dataclasses
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
 
 from tools.base import Tool, ToolResult, ToolResultStatus, ToolParameter
 
@@ -12,6 +16,49 @@ from .embeddings import EmbeddingService
 from .vectordb import VectorDB
 
 
+# Query embeddings are stable for a given model, so keep them for long.
+# Search results are dropped whenever the vector DB changes; the short TTL
+# only bounds staleness for writes the DB's version() cannot see.
+QUERY_CACHE_SIZE = 2048
+QUERY_CACHE_TTL = 3600.0
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_TTL = 60.0
+
+
+class _TTLCache:
+    """Small LRU cache whose entries also expire after ttl seconds."""
+    
+    __slots__ = ("maxsize", "ttl", "_data")
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+    
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry if full."""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Drop all entries."""
+        self._data.clear()
+
+
 class RAGSearchTool(Tool):
     """
     Tool for semantic search in the codebase.
@@ -71,6 +118,11 @@ Returns the most relevant code snippets with file paths and line numbers."""
         self.embedding_service = embedding_service
         self.vectordb = vectordb
         self._initialized = False
+        
+        # Agents often retry or repeat queries; skip the embedding round-trip
+        self._query_cache = _TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+        self._result_cache = _TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+        self._result_version = None
     
     def _ensure_initialized(self) -> None:
         """Ensure services are initialized."""
@@ -116,8 +168,23 @@ Returns the most relevant code snippets with file paths and line numbers."""
         self._ensure_initialized()
         
         try:
-            # Generate query embedding
-            query_embedding = await self.embedding_service.embed_text(query)
+            # Cached results are only valid for the data they were computed on
+            version = self.vectordb.version()
+            if version != self._result_version:
+                self._result_cache.clear()
+                self._result_version = version
+            
+            query_key = hashlib.blake2b(query.encode(), digest_size=16).digest()
+            result_key = (query_key, n_results, language, file_path)
+            cached = self._result_cache.get(result_key)
+            if cached is not None:
+                return self._copy_result(cached)
+            
+            # Generate query embedding (or reuse one for the same query text)
+            query_embedding = self._query_cache.get(query_key)
+            if query_embedding is None:
+                query_embedding = await self.embedding_service.embed_text(query)
+                self._query_cache.put(query_key, query_embedding)
             
             # Search vector DB
             results = self.vectordb.search(
@@ -129,10 +196,12 @@ Returns the most relevant code snippets with file paths and line numbers."""
             )
             
             if not results:
-                return ToolResult(
+                result = ToolResult(
                     status=ToolResultStatus.SUCCESS,
                     output="No relevant results found for query.",
                 )
+                self._result_cache.put(result_key, result)
+                return self._copy_result(result)
             
             # Format results
             formatted_results = []
@@ -157,11 +226,13 @@ Returns the most relevant code snippets with file paths and line numbers."""
             # Format output for LLM
             output = self._format_results(formatted_results)
             
-            return ToolResult(
+            result = ToolResult(
                 status=ToolResultStatus.SUCCESS,
                 output=output,
                 metadata={"results_count": len(formatted_results), "query": query},
             )
+            self._result_cache.put(result_key, result)
+            return self._copy_result(result)
             
         except Exception as e:
             return ToolResult(
@@ -170,24 +241,23 @@ Returns the most relevant code snippets with file paths and line numbers."""
                 error=str(e),
             )
     
+    @staticmethod
+    def _copy_result(result: ToolResult) -> ToolResult:
+        """Copy a cached result, so callers cannot modify the cached one."""
+        return dataclasses.replace(result, metadata=dict(result.metadata))
+    
     def _format_results(self, results: list[dict]) -> str:
         """Format search results for LLM consumption."""
         if not results:
             return "No relevant code found."
         
-        output_lines = [
-            f"Found {len(results)} relevant code snippets:",
-            "",
+        # One f-string per result and a single join
+        blocks = [
+            f"### {item['rank']}. {item['file']} (lines {item['lines']})\n"
+            f"Language: {item['language']} | Type: {item['type']} | Score: {item['score']}\n"
+            f"```{item['language']}\n"
+            f"{item['content']}\n"
+            "```\n"
+            for item in results
         ]
-        
-        for item in results:
-            output_lines.extend([
-                f"### {item['rank']}. {item['file']} (lines {item['lines']})",
-                f"Language: {item['language']} | Type: {item['type']} | Score: {item['score']}",
-                "```" + item['language'],
-                item['content'],
-                "```",
-                "",
-            ])
-        
-        return "\n".join(output_lines)
+        return f"Found {len(results)} relevant code snippets:\n\n" + "\n".join(blocks)
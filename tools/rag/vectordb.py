@@ -1,20 +1,36 @@
 """
 Vector Database wrapper for RAG.
 
-Uses ChromaDB for persistent vector storage.
+Uses ChromaDB for persistent vector storage; chunk text is kept in a
+compressed ContentStore next to it.
 """
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, Optional, Union
 
 import chromadb
+import numpy as np
 from chromadb.config import Settings
 
 from .chunker import Chunk
+from .content_store import ContentStore
 
 
-@dataclass
+# Compact the content store once this share of it belongs to deleted chunks
+COMPACT_DEAD_RATIO = 0.5
+
+
+def _file_version(path: Path) -> Optional[tuple[int, int]]:
+    """(mtime, size) of a file, or None if it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@dataclass(slots=True)
 class SearchResult:
     """Result from a vector search."""
     chunk: Chunk
@@ -36,12 +52,28 @@ class VectorDB:
         db = VectorDB(persist_dir=".hive/vectordb")
         db.add_chunks(chunks, embeddings)
         results = db.search(query_embedding, n_results=5)
+    
+    Pass backend="faiss" to get a FaissVectorDB (same API) for corpora
+    too large for ChromaDB's per-query SQLite reads.
     """
     
+    def __new__(
+        cls,
+        persist_dir: str = ".hive/vectordb",
+        collection_name: str = "hive_codebase",
+        backend: str = "chroma",
+        **kwargs,
+    ):
+        if cls is VectorDB and backend == "faiss":
+            from .vectordb_faiss import FaissVectorDB
+            cls = FaissVectorDB
+        return super().__new__(cls)
+    
     def __init__(
         self,
         persist_dir: str = ".hive/vectordb",
         collection_name: str = "hive_codebase",
+        backend: str = "chroma",
     ):
         """
         Initialize vector database.
@@ -49,9 +81,14 @@ class VectorDB:
         Args:
             persist_dir: Directory for persistent storage
             collection_name: Name of the collection
+            backend: "chroma" (default) or "faiss"
         """
+        if backend != "chroma":
+            raise ValueError(f"Unknown vector DB backend: {backend}")
+        
         self.persist_dir = Path(persist_dir)
         self.collection_name = collection_name
+        self.backend = backend
         
         # Ensure directory exists
         self.persist_dir.mkdir(parents=True, exist_ok=True)
@@ -66,6 +103,8 @@ class VectorDB:
         )
         
         self.collection = self.get_or_create_collection(collection_name)
+        self.content_store = ContentStore(self.persist_dir / f"{collection_name}.content")
+        self._mutations = 0
     
     def get_or_create_collection(self, name: str) -> chromadb.Collection:
         """Get existing collection or create new one."""
@@ -77,14 +116,14 @@ class VectorDB:
     def add_chunks(
         self,
         chunks: list[Chunk],
-        embeddings: list[list[float]],
+        embeddings: Union[np.ndarray, list[list[float]]],
     ) -> None:
         """
         Add chunks with their embeddings to the database.
         
         Args:
             chunks: List of Chunk objects
-            embeddings: Corresponding embedding vectors
+            embeddings: Corresponding embedding vectors (one row per chunk)
         """
         if not chunks:
             return
@@ -92,9 +131,12 @@ class VectorDB:
         if len(chunks) != len(embeddings):
             raise ValueError(f"Mismatch: {len(chunks)} chunks vs {len(embeddings)} embeddings")
         
+        # Pack once into a contiguous float32 matrix so ChromaDB does not
+        # re-convert nested Python lists on every upsert
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        
         # Prepare data for ChromaDB
         ids = [chunk.id for chunk in chunks]
-        documents = [chunk.content for chunk in chunks]
         metadatas = [
             {
                 "file_path": chunk.file_path,
@@ -106,17 +148,94 @@ class VectorDB:
             for chunk in chunks
         ]
         
-        # Add to collection (ChromaDB handles duplicates by ID)
-        self.collection.upsert(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas,
-        )
+        # Store the text compressed, one frame per file, and keep only a
+        # reference to it (frame and byte range) in ChromaDB
+        encoded = [chunk.content.encode() for chunk in chunks]
+        by_file: dict[str, list[int]] = {}
+        for i, chunk in enumerate(chunks):
+            by_file.setdefault(chunk.file_path, []).append(i)
+        
+        # Locked until the references are in ChromaDB, so a compaction by
+        # another instance cannot drop the new frames in between
+        with self.content_store.locked():
+            refs = self.content_store.append(
+                [b"".join(encoded[i] for i in indices) for indices in by_file.values()]
+            )
+            for (offset, length), indices in zip(refs, by_file.values()):
+                start = 0
+                for i in indices:
+                    end = start + len(encoded[i])
+                    metadatas[i].update(
+                        content_offset=offset,
+                        content_length=length,
+                        content_start=start,
+                        content_end=end,
+                    )
+                    start = end
+            
+            # Add to collection (ChromaDB handles duplicates by ID)
+            self.collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+            )
+        self._mutations += 1
+    
+    def add_chunks_stream(
+        self,
+        batches: Iterable[tuple[list[Chunk], Union[np.ndarray, list[list[float]]]]],
+        batch_size: int = 2048,
+    ) -> int:
+        """
+        Add many (chunks, embeddings) pairs, coalesced into large upserts.
+        
+        Each upsert pays fixed index-update and commit costs, so small
+        per-file batches are buffered and written batch_size chunks at a time.
+        
+        Args:
+            batches: Iterable of (chunks, embeddings) pairs
+            batch_size: Chunks per upsert
+            
+        Returns:
+            Number of chunks added
+        """
+        buffered_chunks: list[Chunk] = []
+        buffered_embeddings: list = []
+        total = 0
+        
+        for chunks, embeddings in batches:
+            if len(chunks) != len(embeddings):
+                raise ValueError(f"Mismatch: {len(chunks)} chunks vs {len(embeddings)} embeddings")
+            buffered_chunks.extend(chunks)
+            buffered_embeddings.extend(embeddings)
+            
+            while len(buffered_chunks) >= batch_size:
+                self.add_chunks(buffered_chunks[:batch_size], buffered_embeddings[:batch_size])
+                del buffered_chunks[:batch_size]
+                del buffered_embeddings[:batch_size]
+                total += batch_size
+        
+        if buffered_chunks:
+            self.add_chunks(buffered_chunks, buffered_embeddings)
+            total += len(buffered_chunks)
+        
+        return total
+    
+    def version(self) -> tuple:
+        """
+        Token that changes whenever the stored chunks may have changed.
+        
+        Covers writes through this instance and, via the content store
+        file, writes by other instances or processes on the same directory.
+        """
+        return self._mutations, _file_version(self.content_store.path)
+    
+    def flush(self) -> None:
+        """Persist pending changes (ChromaDB already persists every write)."""
     
     def search(
         self,
-        query_embedding: list[float],
+        query_embedding: Union[np.ndarray, list[float]],
         n_results: int = 5,
         filter_file: Optional[str] = None,
         filter_language: Optional[str] = None,
@@ -135,6 +254,46 @@ class VectorDB:
         Returns:
             List of SearchResult objects, sorted by relevance
         """
+        _, distances, metadatas, documents = self.search_raw(
+            query_embedding,
+            n_results=n_results,
+            filter_file=filter_file,
+            filter_language=filter_language,
+        )
+        
+        # ChromaDB returns cosine distance: similarity = 1 - distance.
+        # Threshold all hits at once; only survivors become objects.
+        scores = 1.0 - distances
+        keep = np.flatnonzero(scores >= score_threshold)
+        
+        return [
+            SearchResult(
+                chunk=self._make_chunk(documents[i], metadatas[i]),
+                score=float(scores[i]),
+            )
+            for i in keep
+        ]
+    
+    def search_raw(
+        self,
+        query_embedding: Union[np.ndarray, list[float]],
+        n_results: int = 5,
+        filter_file: Optional[str] = None,
+        filter_language: Optional[str] = None,
+    ) -> tuple[list[str], np.ndarray, list[dict], list[str]]:
+        """
+        Search for similar chunks without building result objects.
+        
+        Args:
+            query_embedding: Query vector
+            n_results: Maximum number of results
+            filter_file: Optional file path filter
+            filter_language: Optional language filter
+            
+        Returns:
+            Tuple of (ids, cosine distances, metadatas, documents), sorted
+            by relevance
+        """
         # Build where filter
         where_filter = None
         if filter_file or filter_language:
@@ -157,34 +316,52 @@ class VectorDB:
             include=["documents", "metadatas", "distances"],
         )
         
-        # Convert to SearchResult objects
-        search_results = []
-        
-        if results["ids"] and results["ids"][0]:
-            for i, doc_id in enumerate(results["ids"][0]):
-                # ChromaDB returns distance, convert to similarity score
-                # For cosine distance: similarity = 1 - distance
-                distance = results["distances"][0][i]
-                score = 1 - distance
-                
-                if score < score_threshold:
-                    continue
-                
-                metadata = results["metadatas"][0][i]
-                content = results["documents"][0][i]
-                
-                chunk = Chunk(
-                    content=content,
-                    file_path=metadata["file_path"],
-                    start_line=metadata["start_line"],
-                    end_line=metadata["end_line"],
-                    language=metadata["language"],
-                    chunk_type=metadata.get("chunk_type", "code"),
-                )
-                
-                search_results.append(SearchResult(chunk=chunk, score=score))
+        if not results["ids"] or not results["ids"][0]:
+            return [], np.empty(0), [], []
         
-        return search_results
+        metadatas = results["metadatas"][0]
+        return (
+            results["ids"][0],
+            np.asarray(results["distances"][0], dtype=np.float64),
+            metadatas,
+            self._load_documents(results["documents"][0], metadatas),
+        )
+    
+    def _load_documents(self, documents: Optional[list], metadatas: list[dict]) -> list[str]:
+        """
+        Resolve chunk text from the content store.
+        
+        Rows written before the content store existed keep their text in
+        ChromaDB's documents, which is used as is.
+        """
+        refs = [
+            (metadata["content_offset"], metadata["content_length"])
+            for metadata in metadatas
+            if "content_offset" in metadata
+        ]
+        frames = self.content_store.read(refs)
+        if documents is None:
+            documents = [None] * len(metadatas)
+        
+        return [
+            frames[(metadata["content_offset"], metadata["content_length"])][
+                metadata["content_start"]:metadata["content_end"]
+            ].decode()
+            if "content_offset" in metadata else document
+            for document, metadata in zip(documents, metadatas)
+        ]
+    
+    @staticmethod
+    def _make_chunk(content: str, metadata: dict) -> Chunk:
+        """Build a Chunk from a stored document and its metadata."""
+        return Chunk(
+            content=content,
+            file_path=metadata["file_path"],
+            start_line=metadata["start_line"],
+            end_line=metadata["end_line"],
+            language=metadata["language"],
+            chunk_type=metadata.get("chunk_type", "code"),
+        )
     
     def delete_by_file(self, file_path: str) -> int:
         """
@@ -199,39 +376,103 @@ class VectorDB:
         # Get IDs of chunks from this file
         results = self.collection.get(
             where={"file_path": file_path},
-            include=[],
+            include=["metadatas"],
         )
         
         if results["ids"]:
             self.collection.delete(ids=results["ids"])
+            self._release_content(results["metadatas"])
             return len(results["ids"])
         
         return 0
     
+    def delete_by_files(self, file_paths: Iterable[str]) -> int:
+        """
+        Delete all chunks from several files with one lookup.
+        
+        Args:
+            file_paths: Paths of the files
+            
+        Returns:
+            Number of chunks deleted
+        """
+        file_paths = list(dict.fromkeys(file_paths))
+        if not file_paths:
+            return 0
+        
+        results = self.collection.get(
+            where={"file_path": {"$in": file_paths}},
+            include=["metadatas"],
+        )
+        
+        ids = results["ids"]
+        # Deletes are capped at the client's maximum batch size
+        max_batch = self.client.get_max_batch_size()
+        for i in range(0, len(ids), max_batch):
+            self.collection.delete(ids=ids[i:i + max_batch])
+        self._release_content(results["metadatas"])
+        
+        return len(ids)
+    
+    def _release_content(self, metadatas: list[dict]) -> None:
+        """Count the frames of deleted chunks as dead; compact when enough are."""
+        self._mutations += 1
+        frames = {
+            (metadata["content_offset"], metadata["content_length"])
+            for metadata in metadatas
+            if "content_offset" in metadata
+        }
+        self.content_store.mark_dead(sum(length for _, length in frames))
+        
+        dead, size = self.content_store.usage()
+        if dead > COMPACT_DEAD_RATIO * size:
+            self.compact()
+    
+    def compact(self) -> None:
+        """Rewrite the content store without the frames of deleted chunks."""
+        with self.content_store.locked():
+            self._compact_locked()
+    
+    def _compact_locked(self) -> None:
+        """Compact the content store (caller holds its lock)."""
+        results = self.collection.get(include=["metadatas"])
+        rows = [
+            (chunk_id, metadata)
+            for chunk_id, metadata in zip(results["ids"], results["metadatas"])
+            if "content_offset" in metadata
+        ]
+        
+        def relocate(moved: dict[int, int]) -> None:
+            for _, metadata in rows:
+                metadata["content_offset"] = moved[metadata["content_offset"]]
+            max_batch = self.client.get_max_batch_size()
+            for i in range(0, len(rows), max_batch):
+                batch = rows[i:i + max_batch]
+                self.collection.update(
+                    ids=[chunk_id for chunk_id, _ in batch],
+                    metadatas=[metadata for _, metadata in batch],
+                )
+        
+        self.content_store.compact(
+            [(metadata["content_offset"], metadata["content_length"]) for _, metadata in rows],
+            relocate,
+        )
+    
     def get_file_chunks(self, file_path: str) -> list[Chunk]:
         """Get all chunks from a specific file."""
+        return list(self.iter_file_chunks(file_path))
+    
+    def iter_file_chunks(self, file_path: str) -> Iterator[Chunk]:
+        """Yield the chunks of a specific file, building each one on demand."""
         results = self.collection.get(
             where={"file_path": file_path},
             include=["documents", "metadatas"],
         )
         
-        chunks = []
-        if results["ids"]:
-            for i, doc_id in enumerate(results["ids"]):
-                metadata = results["metadatas"][i]
-                content = results["documents"][i]
-                
-                chunk = Chunk(
-                    content=content,
-                    file_path=metadata["file_path"],
-                    start_line=metadata["start_line"],
-                    end_line=metadata["end_line"],
-                    language=metadata["language"],
-                    chunk_type=metadata.get("chunk_type", "code"),
-                )
-                chunks.append(chunk)
-        
-        return chunks
+        metadatas = results["metadatas"] or []
+        documents = self._load_documents(results["documents"], metadatas)
+        for content, metadata in zip(documents, metadatas):
+            yield self._make_chunk(content, metadata)
     
     def get_stats(self) -> dict[str, Any]:
         """Get collection statistics."""
@@ -247,8 +488,12 @@ class VectorDB:
         """Clear all data from the collection."""
         self.client.delete_collection(self.collection_name)
         self.collection = self.get_or_create_collection(self.collection_name)
+        self.content_store.clear()
+        self._mutations += 1
     
     def reset(self) -> None:
         """Reset the entire database."""
         self.client.reset()
         self.collection = self.get_or_create_collection(self.collection_name)
+        self.content_store.clear()
+        self._mutations += 1
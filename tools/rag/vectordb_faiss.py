@@ -0,0 +1,380 @@
+"""
+FAISS backend for the RAG vector database.
+
+Keeps vectors in an in-process FAISS index and chunk metadata in a JSON
+sidecar. Small collections use an exact flat index; once a collection
+reaches train_size vectors it is rebuilt as an IVF index with product or
+int8 scalar quantization, which compresses vectors and searches only the
+nearest inverted lists.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+from .chunker import Chunk
+from .vectordb import VectorDB, _file_version
+
+try:
+    import faiss  # Optional: install the "faiss" extra
+except ImportError:
+    faiss = None
+
+try:
+    import orjson  # Optional: faster metadata (de)serialization
+except ImportError:
+    orjson = None
+
+
+class FaissVectorDB(VectorDB):
+    """
+    FAISS implementation of the VectorDB API.
+    
+    Writing the index and sidecar costs O(collection), so changes are kept
+    in memory until flush() persists them all at once.
+    
+    Usage:
+        db = VectorDB(persist_dir=".hive/vectordb", backend="faiss")
+        db.add_chunks(chunks, embeddings)
+        results = db.search(query_embedding, n_results=5)
+        db.flush()
+    """
+    
+    def __init__(
+        self,
+        persist_dir: str = ".hive/vectordb",
+        collection_name: str = "hive_codebase",
+        backend: str = "faiss",
+        *,
+        nlist: int = 4096,
+        pq_m: int = 64,
+        quantizer: str = "pq",
+        train_size: int = 100_000,
+        nprobe: int = 32,
+    ):
+        """
+        Initialize FAISS vector database.
+        
+        Args:
+            persist_dir: Directory for persistent storage
+            collection_name: Name of the collection
+            backend: Always "faiss" (accepted for VectorDB compatibility)
+            nlist: Number of IVF lists once the index is trained
+            pq_m: Number of PQ sub-quantizers (falls back to uncompressed
+                IVF lists if the dimension is not divisible by it)
+            quantizer: Vector codec of the trained index: "pq" (product
+                quantization, smallest) or "sq8" (int8 scalar quantization,
+                4x smaller than float32 with near-exact recall)
+            train_size: Vector count at which the flat index becomes IVF
+            nprobe: IVF lists scanned per query
+        """
+        if faiss is None:
+            raise ImportError("FAISS backend requires faiss: pip install 'hive-agents[faiss]'")
+        if quantizer not in ("pq", "sq8"):
+            raise ValueError(f"Unknown FAISS quantizer: {quantizer}")
+        
+        self.persist_dir = Path(persist_dir)
+        self.collection_name = collection_name
+        self.backend = "faiss"
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.quantizer = quantizer
+        self.train_size = train_size
+        self.nprobe = nprobe
+        
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.persist_dir / f"{collection_name}.faiss"
+        self.meta_file = self.persist_dir / f"{collection_name}.meta.json"
+        
+        # int64 FAISS id -> (chunk id, document, metadata)
+        self._records: dict[int, tuple[str, str, dict]] = {}
+        self._ids: dict[str, int] = {}
+        self._file_ids: dict[str, set[int]] = {}
+        self._next_id = 0
+        self._dirty = False
+        self._mutations = 0
+        self.index = None
+        
+        self._load()
+    
+    def _load(self) -> None:
+        """Load a previously persisted index and its metadata."""
+        if not self.meta_file.exists():
+            return
+        
+        data = self.meta_file.read_bytes()
+        meta = orjson.loads(data) if orjson else json.loads(data)
+        self._next_id = meta["next_id"]
+        for int_id, chunk_id, document, metadata in meta["records"]:
+            self._insert_record(int_id, chunk_id, document, metadata)
+        
+        if self.index_file.exists():
+            self.index = faiss.read_index(str(self.index_file))
+    
+    def _persist(self) -> None:
+        """Write index and metadata (atomically, via temp files)."""
+        meta = {
+            "next_id": self._next_id,
+            "records": [
+                [int_id, chunk_id, document, metadata]
+                for int_id, (chunk_id, document, metadata) in self._records.items()
+            ],
+        }
+        data = orjson.dumps(meta) if orjson else json.dumps(meta).encode()
+        tmp_meta = self.meta_file.with_suffix(".json.tmp")
+        tmp_meta.write_bytes(data)
+        
+        if self.index is not None:
+            tmp_index = self.index_file.with_suffix(".faiss.tmp")
+            faiss.write_index(self.index, str(tmp_index))
+            os.replace(tmp_index, self.index_file)
+        elif self.index_file.exists():
+            self.index_file.unlink()
+        os.replace(tmp_meta, self.meta_file)
+    
+    def _insert_record(self, int_id: int, chunk_id: str, document: str, metadata: dict) -> None:
+        """Register a record in the lookup tables."""
+        self._records[int_id] = (chunk_id, document, metadata)
+        self._ids[chunk_id] = int_id
+        self._file_ids.setdefault(metadata["file_path"], set()).add(int_id)
+    
+    def _remove_ids(self, int_ids: list[int]) -> None:
+        """Remove records from the index and the lookup tables."""
+        if not int_ids:
+            return
+        
+        self.index.remove_ids(np.asarray(int_ids, dtype=np.int64))
+        for int_id in int_ids:
+            chunk_id, _, metadata = self._records.pop(int_id)
+            del self._ids[chunk_id]
+            file_ids = self._file_ids[metadata["file_path"]]
+            file_ids.discard(int_id)
+            if not file_ids:
+                del self._file_ids[metadata["file_path"]]
+    
+    def _maybe_train(self) -> None:
+        """Rebuild the flat index as a quantized IVF index once it holds train_size vectors."""
+        if self.index.ntotal < self.train_size or not isinstance(self.index, faiss.IndexIDMap2):
+            return
+        
+        dim = self.index.d
+        vectors = self.index.index.reconstruct_n(0, self.index.ntotal)
+        ids = faiss.vector_to_array(self.index.id_map)
+        
+        if self.quantizer == "sq8":
+            # Per-dimension int8 codes; decoded on the fly when scoring
+            codec = "SQ8"
+        elif dim % self.pq_m == 0:
+            codec = f"PQ{self.pq_m}"
+        else:
+            codec = "Flat"
+        nlist = min(self.nlist, len(vectors))
+        index = faiss.index_factory(dim, f"IVF{nlist},{codec}", faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors[:self.train_size])
+        index.add_with_ids(vectors, ids)
+        faiss.extract_index_ivf(index).nprobe = self.nprobe
+        self.index = index
+    
+    def add_chunks(
+        self,
+        chunks: list[Chunk],
+        embeddings: Union[np.ndarray, list[list[float]]],
+    ) -> None:
+        """
+        Add chunks with their embeddings to the database.
+        
+        Args:
+            chunks: List of Chunk objects
+            embeddings: Corresponding embedding vectors (one row per chunk)
+        """
+        if not chunks:
+            return
+        
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Mismatch: {len(chunks)} chunks vs {len(embeddings)} embeddings")
+        
+        # Copy: vectors are normalized in place so inner product = cosine
+        vectors = np.array(embeddings, dtype=np.float32, order="C")
+        faiss.normalize_L2(vectors)
+        
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+        
+        # Upsert: drop any previous version of these chunk ids
+        self._remove_ids([self._ids[chunk.id] for chunk in chunks if chunk.id in self._ids])
+        
+        ids = np.arange(self._next_id, self._next_id + len(chunks), dtype=np.int64)
+        self._next_id += len(chunks)
+        for int_id, chunk in zip(ids.tolist(), chunks):
+            self._insert_record(int_id, chunk.id, chunk.content, {
+                "file_path": chunk.file_path,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line,
+                "language": chunk.language,
+                "chunk_type": chunk.chunk_type,
+            })
+        
+        self.index.add_with_ids(vectors, ids)
+        self._maybe_train()
+        self._dirty = True
+        self._mutations += 1
+    
+    def version(self) -> tuple:
+        """Token that changes whenever the stored chunks may have changed."""
+        return self._mutations, _file_version(self.meta_file)
+    
+    def flush(self) -> None:
+        """Persist pending changes (index and metadata) in one write."""
+        if self._dirty:
+            self._persist()
+            self._dirty = False
+    
+    def search_raw(
+        self,
+        query_embedding: Union[np.ndarray, list[float]],
+        n_results: int = 5,
+        filter_file: Optional[str] = None,
+        filter_language: Optional[str] = None,
+    ) -> tuple[list[str], np.ndarray, list[dict], list[str]]:
+        """
+        Search for similar chunks without building result objects.
+        
+        Args:
+            query_embedding: Query vector
+            n_results: Maximum number of results
+            filter_file: Optional file path filter
+            filter_language: Optional language filter
+            
+        Returns:
+            Tuple of (ids, cosine distances, metadatas, documents), sorted
+            by relevance
+        """
+        if self.index is None or self.index.ntotal == 0:
+            return [], np.empty(0), [], []
+        
+        query = np.array(query_embedding, dtype=np.float32, order="C").reshape(1, -1)
+        faiss.normalize_L2(query)
+        
+        params = None
+        if filter_file or filter_language:
+            if filter_file:
+                candidates = self._file_ids.get(filter_file, set())
+            else:
+                candidates = self._records.keys()
+            if filter_language:
+                candidates = [i for i in candidates if self._records[i][2]["language"] == filter_language]
+            if not candidates:
+                return [], np.empty(0), [], []
+            
+            candidate_ids = np.fromiter(candidates, dtype=np.int64)
+            selector = faiss.IDSelectorBatch(candidate_ids.size, faiss.swig_ptr(candidate_ids))
+            if isinstance(self.index, faiss.IndexIDMap2):
+                params = faiss.SearchParameters(sel=selector)
+            else:
+                # The selector only filters within the probed lists, so
+                # probing nprobe lists could miss most candidates. Probe
+                # all of them: non-candidates are skipped before scoring.
+                params = faiss.SearchParametersIVF(
+                    sel=selector,
+                    nprobe=faiss.extract_index_ivf(self.index).nlist,
+                )
+        
+        k = min(n_results, self.index.ntotal)
+        similarities, labels = self.index.search(query, k, params=params)
+        
+        found = labels[0] >= 0
+        labels = labels[0][found].tolist()
+        records = [self._records[int_id] for int_id in labels]
+        
+        return (
+            [record[0] for record in records],
+            1.0 - similarities[0][found].astype(np.float64),
+            [record[2] for record in records],
+            [record[1] for record in records],
+        )
+    
+    def _load_documents(self, documents: Optional[list], metadatas: list[dict]) -> list[str]:
+        """Chunk text is kept in the records, so documents are used as is."""
+        return documents
+    
+    def delete_by_file(self, file_path: str) -> int:
+        """
+        Delete all chunks from a specific file.
+        
+        Args:
+            file_path: Path to the file
+            
+        Returns:
+            Number of chunks deleted
+        """
+        int_ids = list(self._file_ids.get(file_path, ()))
+        if not int_ids:
+            return 0
+        
+        self._remove_ids(int_ids)
+        self._dirty = True
+        self._mutations += 1
+        return len(int_ids)
+    
+    def delete_by_files(self, file_paths: Iterable[str]) -> int:
+        """
+        Delete all chunks from several files.
+        
+        Args:
+            file_paths: Paths of the files
+            
+        Returns:
+            Number of chunks deleted
+        """
+        int_ids = [
+            int_id
+            for file_path in set(file_paths)
+            for int_id in self._file_ids.get(file_path, ())
+        ]
+        if not int_ids:
+            return 0
+        
+        self._remove_ids(int_ids)
+        self._dirty = True
+        self._mutations += 1
+        return len(int_ids)
+    
+    def _release_content(self, metadatas: list[dict]) -> None:
+        """Deleted records free their text with them; nothing to release."""
+    
+    def compact(self) -> None:
+        """Nothing to compact: flush() rewrites the sidecar without deleted records."""
+    
+    def _compact_locked(self) -> None:
+        """Nothing to compact (see compact())."""
+    
+    def iter_file_chunks(self, file_path: str) -> Iterator[Chunk]:
+        """Yield the chunks of a specific file, building each one on demand."""
+        for int_id in sorted(self._file_ids.get(file_path, ())):
+            _, document, metadata = self._records[int_id]
+            yield self._make_chunk(document, metadata)
+    
+    def get_stats(self) -> dict[str, Any]:
+        """Get collection statistics."""
+        return {
+            "collection_name": self.collection_name,
+            "total_chunks": len(self._records),
+            "persist_dir": str(self.persist_dir),
+        }
+    
+    def clear(self) -> None:
+        """Clear all data from the collection."""
+        self._records.clear()
+        self._ids.clear()
+        self._file_ids.clear()
+        self._next_id = 0
+        self.index = None
+        self._dirty = True
+        self._mutations += 1
+    
+    def reset(self) -> None:
+        """Reset the entire database."""
+        self.clear()
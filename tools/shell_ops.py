@@ -2,14 +2,23 @@
 
 import asyncio
 import os
+import re
 import shlex
+import signal
+from functools import lru_cache
 from typing import Optional
 
 from .base import Tool, ToolResult, ToolParameter, ToolResultStatus
+from .guardrails import get_validator
+
+try:
+    import ahocorasick  # Optional: C multi-pattern matcher (pyahocorasick)
+except ImportError:
+    ahocorasick = None
 
 
 # Whitelist of allowed command prefixes
-ALLOWED_COMMANDS = {
+ALLOWED_COMMANDS = frozenset({
     # Python
     "pytest", "python", "pip", "ruff", "black", "mypy", "pylint", "flake8",
     # Node.js / Bun
@@ -25,10 +34,13 @@ ALLOWED_COMMANDS = {
     # General utilities
     "cat", "head", "tail", "grep", "find", "ls", "echo", "pwd", "wc",
     "sort", "uniq", "diff", "tree", "which", "env",
-}
+})
+
+# Allow-list as shown in rejection messages, built once
+_ALLOWED_COMMANDS_STR = ", ".join(sorted(ALLOWED_COMMANDS))
 
 # Blacklist of dangerous commands/patterns
-BLOCKED_PATTERNS = {
+BLOCKED_PATTERNS = frozenset({
     "rm -rf /", "rm -rf ~", "rm -rf *",
     "sudo", "su ",
     "> /dev/", "| /dev/",
@@ -39,9 +51,87 @@ BLOCKED_PATTERNS = {
     "eval", "exec",
     ">/etc/", ">> /etc/",
     "shutdown", "reboot", "halt", "poweroff",
-}
+})
+
+
+def _build_blocked_automaton():
+    """Build an Aho-Corasick automaton over BLOCKED_PATTERNS, if available."""
+    if ahocorasick is None:
+        return None
+    automaton = ahocorasick.Automaton()
+    for pattern in BLOCKED_PATTERNS:
+        # Keys match the lowercased command; the value is what gets reported
+        automaton.add_word(pattern.lower(), pattern)
+    automaton.make_automaton()
+    return automaton
+
+
+# First word of a command without quotes or escapes (shlex's whitespace)
+_FIRST_WORD_RE = re.compile(r"[ \t\r\n]*([^ \t\r\n]+)")
+
+# Matches when that first word is an allowed command, optionally behind a
+# path: accepts exactly what _FIRST_WORD_RE + the whitelist lookup accept
+_ALLOWED_RE = re.compile(
+    r"[ \t\r\n]*(?:[^ \t\r\n]*/)?(?:"
+    + "|".join(re.escape(c) for c in sorted(ALLOWED_COMMANDS, key=lambda c: (-len(c), c)))
+    + r")(?=[ \t\r\n]|\Z)"
+)
+
+# Finds every blocked pattern in one pass over the command
+_BLOCKED_AC = _build_blocked_automaton()
+
+# Fallback without pyahocorasick: one compiled alternation, still a single
+# C-level scan (longest patterns first, so the most specific one is
+# reported). Case-insensitive, so the command needs no lowercased copy;
+# one group per pattern maps a match back to the configured pattern.
+_BLOCKED_LIST = sorted(BLOCKED_PATTERNS, key=lambda p: (-len(p), p))
+_BLOCKED_RE = re.compile(
+    "|".join(f"({re.escape(p)})" for p in _BLOCKED_LIST),
+    re.IGNORECASE,
+)
+
+
+# The user's shell, resolved once. Commands run with the inherited
+# environment (PATH, VIRTUAL_ENV, ...); sourcing the login profiles costs
+# 50-300 ms per command, so it is opt-in via HIVE_LOGIN_SHELL=1 for setups
+# that need it (e.g. nvm initialized only in ~/.bash_profile).
+_SHELL = os.getenv("SHELL", "/bin/bash")
+_SHELL_ARGS = ("-l", "-c") if os.getenv("HIVE_LOGIN_SHELL") == "1" else ("-c",)
+
+# Output kept per stream, in characters; UTF-8 needs at most 4 bytes each,
+# so buffering this many bytes always covers the kept characters
+MAX_OUTPUT = 10000
+_MAX_OUTPUT_BYTES = MAX_OUTPUT * 4
+
+# Upper bound per stream read: take whatever the pipe transport has
+# buffered in one call, so chatty commands cost few loop iterations
+_READ_SIZE = 1 << 20
+
+
+async def _drain(stream: asyncio.StreamReader, limit: int) -> tuple[bytes, bool]:
+    """
+    Read a stream to EOF, keeping only its first limit bytes.
+    
+    Reading continues past the limit, so the child never blocks on a full
+    pipe, but the excess is dropped instead of buffered.
+    
+    Returns:
+        Tuple of (kept bytes, whether anything was dropped)
+    """
+    buffer = bytearray()
+    truncated = False
+    while chunk := await stream.read(_READ_SIZE):
+        room = limit - len(buffer)
+        if room > 0:
+            buffer += chunk[:room]
+        if len(chunk) > room:
+            truncated = True
+    return bytes(buffer), truncated
 
 
+# Agents re-run the same commands; the tables are frozen, so the verdict
+# for a command string never changes. Bounded to cap memory.
+@lru_cache(maxsize=1024)
 def is_command_allowed(command: str) -> tuple[bool, Optional[str]]:
     """
     Check if a command is allowed to run.
@@ -49,25 +139,36 @@ def is_command_allowed(command: str) -> tuple[bool, Optional[str]]:
     Returns:
         Tuple of (allowed, reason_if_blocked)
     """
-    command_lower = command.lower().strip()
-    
     # Check against blocked patterns
-    for pattern in BLOCKED_PATTERNS:
-        if pattern in command_lower:
+    if _BLOCKED_AC is not None:
+        for _, pattern in _BLOCKED_AC.iter(command.lower()):
             return False, f"Blocked pattern detected: '{pattern}'"
+    else:
+        match = _BLOCKED_RE.search(command)
+        if match:
+            return False, f"Blocked pattern detected: '{_BLOCKED_LIST[match.lastindex - 1]}'"
     
-    # Extract base command (first word)
-    try:
-        parts = shlex.split(command)
-        if not parts:
-            return False, "Empty command"
-        base_cmd = parts[0].split("/")[-1]  # Handle full paths
-    except ValueError:
-        return False, "Invalid command syntax"
+    # Extract base command (first word). Without quotes or escapes, splitting
+    # on shlex's whitespace gives the same first word, far cheaper, and an
+    # allowed command is recognized in a single match.
+    if "'" in command or '"' in command or "\\" in command:
+        try:
+            parts = shlex.split(command)
+        except ValueError:
+            return False, "Invalid command syntax"
+        first_word = parts[0] if parts else None
+    else:
+        if _ALLOWED_RE.match(command):
+            return True, None
+        match = _FIRST_WORD_RE.match(command)
+        first_word = match.group(1) if match else None
+    if first_word is None:
+        return False, "Empty command"
+    base_cmd = first_word.split("/")[-1]  # Handle full paths
     
     # Check whitelist
     if base_cmd not in ALLOWED_COMMANDS:
-        return False, f"Command '{base_cmd}' is not in the allowed list. Allowed: {', '.join(sorted(ALLOWED_COMMANDS))}"
+        return False, f"Command '{base_cmd}' is not in the allowed list. Allowed: {_ALLOWED_COMMANDS_STR}"
     
     return True, None
 
@@ -124,39 +225,50 @@ Nicht erlaubt: rm -rf, sudo, etc."""
         # Determine working directory
         if self.workspace_path:
             if cwd:
-                work_dir = f"{self.workspace_path}/{cwd}"
+                safe, reason = get_validator(self.workspace_path).is_path_safe(cwd)
+                if not safe:
+                    return ToolResult(
+                        status=ToolResultStatus.ERROR,
+                        output=None,
+                        error=f"Arbeitsverzeichnis nicht erlaubt: {reason}",
+                    )
+                work_dir = os.path.join(self.workspace_path, cwd)
             else:
                 work_dir = self.workspace_path
         else:
             work_dir = cwd or "."
         
         try:
-            # Run command using the user's shell.
-            # We pass the current environment explicitly to ensure PATH/VIRTUAL_ENV are inherited.
-            # We also use -l (login shell) to source shell configs (needed for nvm, etc.)
-            shell_executable = os.getenv("SHELL", "/bin/bash")
-            
-            # Build environment: start with current env, then let shell config override
-            env = os.environ.copy()
-            
+            # Run command using the user's shell. The child inherits the
+            # current environment (PATH/VIRTUAL_ENV, and any later changes
+            # to os.environ) directly, without copying it per call.
             process = await asyncio.create_subprocess_exec(
-                shell_executable,
-                "-l",
-                "-c",
+                _SHELL,
+                *_SHELL_ARGS,
                 command,
                 cwd=work_dir,
-                env=env,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
+                # Own process group, so a timeout can kill the whole tree
+                start_new_session=True,
             )
             
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
+                (stdout, stdout_truncated), (stderr, stderr_truncated), _ = await asyncio.wait_for(
+                    asyncio.gather(
+                        _drain(process.stdout, _MAX_OUTPUT_BYTES),
+                        _drain(process.stderr, _MAX_OUTPUT_BYTES),
+                        process.wait(),
+                    ),
                     timeout=timeout,
                 )
             except asyncio.TimeoutError:
-                process.kill()
+                # Kill the shell and everything it started (test runners,
+                # build tools), not just the shell itself
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
                 await process.wait()
                 return ToolResult(
                     status=ToolResultStatus.ERROR,
@@ -170,21 +282,19 @@ Nicht erlaubt: rm -rf, sudo, etc."""
             exit_code = process.returncode
             
             # Truncate output if too long
-            max_output = 10000
-            if len(stdout_str) > max_output:
-                stdout_str = stdout_str[:max_output] + "\n... (truncated)"
-            if len(stderr_str) > max_output:
-                stderr_str = stderr_str[:max_output] + "\n... (truncated)"
+            if stdout_truncated or len(stdout_str) > MAX_OUTPUT:
+                stdout_str = stdout_str[:MAX_OUTPUT] + "\n... (truncated)"
+            if stderr_truncated or len(stderr_str) > MAX_OUTPUT:
+                stderr_str = stderr_str[:MAX_OUTPUT] + "\n... (truncated)"
             
             # Format output
-            output_parts = []
-            if stdout_str.strip():
-                output_parts.append(f"STDOUT:\n{stdout_str.strip()}")
-            if stderr_str.strip():
-                output_parts.append(f"STDERR:\n{stderr_str.strip()}")
-            output_parts.append(f"\nExit Code: {exit_code}")
-            
-            output = "\n\n".join(output_parts)
+            stdout_str = stdout_str.strip()
+            stderr_str = stderr_str.strip()
+            output = (
+                (f"STDOUT:\n{stdout_str}\n\n" if stdout_str else "")
+                + (f"STDERR:\n{stderr_str}\n\n" if stderr_str else "")
+                + f"\nExit Code: {exit_code}"
+            )
             
             # Determine status based on exit code
             if exit_code == 0:
@@ -222,3 +332,15 @@ Nicht erlaubt: rm -rf, sudo, etc."""
                 output=None,
                 error=f"Fehler bei Befehlsausführung: {str(e)}",
             )
+
+
+# Shared instance per workspace: the tool holds no per-call state, so all
+# registries (one per agent) can reuse it
+@lru_cache(maxsize=None)
+def _make_run_command_tool(workspace_path: Optional[str]) -> RunCommandTool:
+    return RunCommandTool(workspace_path)
+
+
+def get_run_command_tool(workspace_path: Optional[str] = None) -> RunCommandTool:
+    """Get or create the run_command tool singleton for a workspace."""
+    return _make_run_command_tool(workspace_path)